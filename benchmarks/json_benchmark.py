@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare onclick decoders on generated payloads"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+import timeit
+import json
+from yamusic.parsers import fix_json_single_quotes, loads_js, tokenize_js
+import fixtures
+
+
+def album_payload(tracks):
+    return json.dumps({
+        'id': 1, 'title': "album \"1\"", 'cover': 'http://covers/1.jpg',
+        'tracks': [
+            dict(fixtures.track_data(num), title="track 'quoted' %d" % num)
+            for num in range(tracks)
+        ],
+    }).replace("'", "\\'").replace('"', "'")
+
+
+def regex_decode(data):
+    return json.loads(fix_json_single_quotes(data))
+
+
+PAYLOADS = (
+    ('album 20 tracks', album_payload(20)),
+    ('album 500 tracks', album_payload(500)),
+    ('track json', json.dumps(fixtures.track_data(1))),
+)
+
+
+def main(number=20):
+    decoders = (
+        ('regex', regex_decode), ('loads_js', loads_js),
+        ('tokenize_js', tokenize_js),
+    )
+    for name, payload in PAYLOADS:
+        results = []
+        for decoder_name, decoder in decoders:
+            seconds = min(timeit.repeat(
+                lambda: decoder(payload), number=number, repeat=3,
+            )) / number
+            results.append('%s %.3fms' % (decoder_name, seconds * 1000))
+        print '%-17s %s' % (name, ', '.join(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare memory used by loaded catalog:
+
+    python benchmarks/memory_benchmark.py --albums 20000
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import argparse
+import multiprocessing
+from yamusic.app import Search, Album, IdentityCache
+
+TRACKS_PER_ALBUM = 10
+ALBUMS_PER_ARTIST = 10
+
+
+class DictEntity(object):
+    """Entity with dict and denormalized fields, like before slots"""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def album_records(albums):
+    """Records like parsed from album fragments, strings are unicode"""
+    for album_id in xrange(albums):
+        artist_id = album_id // ALBUMS_PER_ARTIST
+        yield {
+            'id': album_id,
+            'title': u'album %d' % album_id,
+            'artist': {'id': artist_id, 'title': u'artist %d' % artist_id},
+            'tracks': [{
+                'id': album_id * 100 + num,
+                'title': u'track %d' % num,
+                'duration': 180,
+                'storage_dir': u'%x.%d' % (album_id * 100 + num, num),
+            } for num in xrange(TRACKS_PER_ALBUM)],
+        }
+
+
+def load_dict(albums):
+    artists = {}
+    loaded = []
+    for record in album_records(albums):
+        artist_record = record['artist']
+        if artist_record['id'] not in artists:
+            artists[artist_record['id']] = DictEntity(**artist_record)
+        artist = artists[artist_record['id']]
+        album = DictEntity(
+            id=record['id'], title=record['title'], artist=artist,
+            artist__id=artist.id, artist__title=artist.title,
+        )
+        album._tracks = [DictEntity(
+            artist=artist, album=album, **track
+        ) for track in record['tracks']]
+        loaded.append(album)
+    return loaded
+
+
+def load_entities(albums, columnar):
+    Search.COLUMNAR_TRACKS = columnar
+    loaded = []
+    for record in album_records(albums):
+        album = Album.get(id=record['id'])
+        album._apply(record)
+        loaded.append(album)
+    return loaded
+
+
+def rss():
+    """Resident memory of current process in bytes"""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def measure(mode, albums, result):
+    Search.TRACKS_CACHE = IdentityCache()
+    Search.ALBUMS_CACHE = IdentityCache()
+    Search.ARTISTS_CACHE = IdentityCache()
+    before = rss()
+    if mode == 'dict':
+        loaded = load_dict(albums)
+    else:
+        loaded = load_entities(albums, mode == 'columnar')
+    result.put(rss() - before)
+    del loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--albums', type=int, default=20000)
+    args = parser.parse_args()
+    tracks = args.albums * TRACKS_PER_ALBUM
+    baseline = None
+    for mode in ('dict', 'slots', 'columnar'):
+        result = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=measure, args=(mode, args.albums, result),
+        )
+        process.start()
+        used = result.get()
+        process.join()
+        baseline = baseline or used
+        print '%-9s %8.1fMB %6.0fB/track %6.2fx' % (
+            mode, used / 1024. ** 2, used / float(tracks),
+            used / float(baseline),
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare fragment parsers on generated fragments"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+import timeit
+import time
+from multiprocessing.pool import ThreadPool
+from yamusic.parsers import SoupParser, FastParser, ProcessParser
+import fixtures
+
+fixtures.TRACKS_PER_ALBUM = 20
+fixtures.ALBUMS_PER_ARTIST = 30
+
+FRAGMENTS = (
+    ('search tracks', 'search', ('tracks', fixtures.search_page_html(
+        0, 30, 50, 'tracks',
+    ))),
+    ('search albums', 'search', ('albums', fixtures.search_page_html(
+        0, 30, 50, 'albums',
+    ))),
+    ('artist', 'artist', (fixtures.artist_html(1),)),
+    ('album', 'album', (fixtures.album_html(1),)),
+    ('track', 'track', (fixtures.track_fragment_html(1, 1),)),
+)
+
+
+def main(number=20):
+    parsers = (('soup', SoupParser()), ('fast', FastParser()))
+    for name, method, args in FRAGMENTS:
+        results = []
+        for parser_name, parser in parsers:
+            seconds = min(timeit.repeat(
+                lambda: getattr(parser, method)(*args),
+                number=number, repeat=3,
+            )) / number
+            results.append('%s %.3fms' % (parser_name, seconds * 1000))
+        print '%-14s %s' % (name, ', '.join(results))
+    throughput()
+
+
+def throughput(fragments=200, threads=8):
+    """Album fragments parsed per second by threads of cursor"""
+    data = [fixtures.album_html(id) for id in range(fragments)]
+    pool = ThreadPool(threads)
+    process = ProcessParser()
+    process.album(data[0])  # start processes
+    for name, parser in (('threads', FastParser()), ('processes', process)):
+        started = time.time()
+        pool.map(parser.album, data)
+        print '%-14s %.0f fragments/s' % (
+            name, fragments / (time.time() - started),
+        )
+    pool.close()
+    process.close()
+
+
+if __name__ == '__main__':
+    main()
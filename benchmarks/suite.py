@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Benchmarks against local stand-in server, results are written as json:
+
+    python benchmarks/suite.py --latency 0.02 --output new.json
+    python benchmarks/suite.py --compare old.json new.json
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+from contextlib import closing
+import argparse
+import platform
+import tempfile
+import shutil
+import json
+import time
+from yamusic.app import Search, Artist, Track, hydrate
+from yamusic.downloader import Downloader
+from server import StandInServer
+import fixtures
+
+fixtures.SEARCH_PAGES = 20
+fixtures.SEARCH_PER_PAGE = 20
+fixtures.TRACKS_PER_ALBUM = 10
+fixtures.ALBUMS_PER_ARTIST = 10
+
+
+def clear_caches():
+    for cache in (
+        Search.TRACKS_CACHE, Search.ALBUMS_CACHE, Search.ARTISTS_CACHE,
+        Search.URLS_CACHE,
+    ):
+        cache.clear()
+
+
+def search_pagination(server, **kwargs):
+    with closing(Search(proxy=server.proxy, **kwargs)) as search:
+        items = len(list(search.search(Search.TYPE_TRACKS, 'q')))
+    return {'items': items}
+
+
+def discography_crawl(server, artists=5, **kwargs):
+    with closing(Search(proxy=server.proxy, **kwargs)) as search, search:
+        crawled = hydrate(
+            [Artist.get(id=id) for id in range(1, artists + 1)], 'tracks',
+        )
+    return {'items': sum(len(artist.get_tracks()) for artist in crawled)}
+
+
+def url_resolution(server, tracks=50, **kwargs):
+    with closing(Search(proxy=server.proxy, **kwargs)) as search, search:
+        urls = search.resolve_urls([
+            Track.get(id=id, storage_dir='dir%d' % id)
+            for id in range(tracks)
+        ])
+    return {'items': len(urls)}
+
+
+def bulk_download(server, tracks=20, **kwargs):
+    directory = tempfile.mkdtemp()
+    try:
+        with closing(Search(proxy=server.proxy)) as search, search:
+            downloader = Downloader(directory, **kwargs)
+            paths = downloader.download([
+                Track.get(id=id, storage_dir='dir%d' % id)
+                for id in range(tracks)
+            ])
+        return {
+            'items': len(paths),
+            'bytes': downloader.downloaded_bytes,
+            'bytes_per_second': downloader.throughput,
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+BENCHMARKS = (
+    ('search_pagination', search_pagination, {}),
+    ('search_pagination_prefetch', search_pagination, {'prefetch': True}),
+    ('discography_crawl', discography_crawl, {'workers': 1}),
+    ('discography_crawl_workers', discography_crawl, {'workers': 8}),
+    ('url_resolution', url_resolution, {'workers': 1}),
+    ('url_resolution_workers', url_resolution, {'workers': 8}),
+    ('bulk_download', bulk_download, {'workers': 1}),
+    ('bulk_download_workers', bulk_download, {'workers': 4}),
+)
+
+
+def run(latency, repeat, names=None):
+    results = {}
+    with StandInServer(latency=latency) as server:
+        for name, benchmark, kwargs in BENCHMARKS:
+            if names and name not in names:
+                continue
+            times = []
+            for _ in range(repeat):
+                clear_caches()
+                server.requests.clear()
+                started = time.time()
+                result = benchmark(server, **kwargs)
+                times.append(time.time() - started)
+            result.update(
+                seconds=min(times), requests=sum(server.requests.values()),
+            )
+            results[name] = result
+    return {
+        'meta': {
+            'time': time.time(),
+            'python': platform.python_version(),
+            'latency': latency,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(old_path, new_path):
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    for name, result in sorted(new['results'].items()):
+        if name in old['results']:
+            ratio = result['seconds'] / old['results'][name]['seconds']
+            print '%-28s %8.3fs %7.2fx' % (name, result['seconds'], ratio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='json file, stdout if omitted')
+    parser.add_argument('--only', nargs='*', help='names of benchmarks')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+    if args.compare:
+        return compare(*args.compare)
+    data = json.dumps(
+        run(args.latency, args.repeat, args.only), indent=2, sort_keys=True,
+    )
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(data)
+    else:
+        print data
+
+
+if __name__ == '__main__':
+    main()
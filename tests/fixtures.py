@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Generated yandex music fragments for offline tests"""
+
+from StringIO import StringIO
+import unittest
+import json
+from yamusic.app import Search
+
+TRACKS_PER_ALBUM = 3
+ALBUMS_PER_ARTIST = 2
+SEARCH_PAGES = 3
+SEARCH_PER_PAGE = 2
+
+
+def track_data(id, album_id=1, artist_id=1):
+    return {
+        'id': id, 'title': 'track %d' % id,
+        'artist_id': artist_id, 'artist': 'artist %d' % artist_id,
+        'album_id': album_id, 'album': 'album %d' % album_id,
+        'cover': 'http://covers/%d.jpg' % album_id,
+        'storage_dir': 'dir%d' % id, 'duration': 180,
+    }
+
+
+def album_tracks(album_id, artist_id=1):
+    return [
+        track_data(album_id * 100 + num, album_id, artist_id)
+        for num in range(TRACKS_PER_ALBUM)
+    ]
+
+
+def track_html(id, album_id=1, artist_id=1, cls='b-track'):
+    return "<div class='%s' onclick='return %s'></div>" % (
+        cls, json.dumps(track_data(id, album_id, artist_id)),
+    )
+
+
+def album_item_html(id, artist_id=1):
+    return (
+        '<div class="b-albums">'
+        '<div class="b-albums__cover"><a href="/album/%(id)d">'
+        '<img src="http://covers/%(id)d.jpg" /></a></div>'
+        '<a class="b-link b-link_class_albums-title-link" '
+        'href="/artist/%(artist_id)d">artist <b>%(artist_id)d</b></a>'
+        '</div>'
+    ) % {'id': id, 'artist_id': artist_id}
+
+
+def artist_item_html(id):
+    return (
+        '<div class="b-artist-group"><a href="/artist/%(id)d">'
+        'artist %(id)d</a></div>'
+    ) % {'id': id}
+
+
+ITEMS_HTML = {
+    'tracks': track_html,
+    'albums': album_item_html,
+    'artists': artist_item_html,
+}
+
+
+def search_page_html(page, pages_count, per_page=2, type='tracks'):
+    pager = ''.join(
+        '<a class="b-pager__page">%d</a>' % (num + 1)
+        for num in range(pages_count)
+    ) + '<b class="b-pager__current">%d</b>' % (page + 1)
+    return pager + ''.join(
+        ITEMS_HTML[type](page * per_page + num) for num in range(per_page)
+    )
+
+
+def album_html(album_id, artist_id=1):
+    return (
+        '<div class="b-title__artist">'
+        '<a href="/artist/%(artist_id)d">artist %(artist_id)d</a></div>'
+        '<h1 class="b-title b-title__title">album %(album_id)d</h1>'
+    ) % {'artist_id': artist_id, 'album_id': album_id} + ''.join(
+        track_html(track['id'], album_id, artist_id)
+        for track in album_tracks(album_id, artist_id)
+    )
+
+
+def artist_album_ids(artist_id):
+    return [
+        artist_id * 10 + num for num in range(ALBUMS_PER_ARTIST)
+    ]
+
+
+def artist_html(artist_id):
+    albums = []
+    for album_id in artist_album_ids(artist_id):
+        data = json.dumps({
+            'id': album_id, 'title': 'album %d' % album_id,
+            'cover': 'http://covers/%d.jpg' % album_id,
+            'tracks': album_tracks(album_id, artist_id),
+        }).replace('"', "'")
+        albums.append(
+            '<div class="b-album-control" onclick="return %s"></div>' % data
+        )
+    return (
+        '<h1 class="b-title__title">artist %d</h1>' % artist_id
+    ) + ''.join(albums)
+
+
+def track_fragment_html(track_id, album_id, artist_id=1):
+    return track_html(
+        track_id, album_id, artist_id,
+        cls='b-track b-track_type_track js-track',
+    )
+
+
+def info_xml(storage_dir):
+    return '<track filename="%s.mp3" />' % storage_dir
+
+
+def download_info_xml(storage_dir, ts='0001'):
+    return (
+        '<download-info><host>storage.local</host>'
+        '<path>/%s/file.mp3</path><ts>%s</ts><s>secret</s>'
+        '</download-info>'
+    ) % (storage_dir, ts)
+
+
+def fragment(url):
+    """Get generated response body for url"""
+    path = url.split('://', 1)[-1].split('/', 1)[-1]
+    parts = path.split('?')[0].split('/')
+    if parts[:2] == ['fragment', 'search']:
+        page = int(url.split('page=')[-1])
+        type = url.split('type=')[-1].split('&')[0]
+        return search_page_html(page, SEARCH_PAGES, SEARCH_PER_PAGE, type)
+    elif parts[:2] == ['fragment', 'artist']:
+        return artist_html(int(parts[2]))
+    elif parts[:2] == ['fragment', 'album']:
+        return album_html(int(parts[2]))
+    elif parts[:2] == ['fragment', 'track']:
+        return track_fragment_html(int(parts[2]), int(parts[4]))
+    elif parts[0] == 'get' and parts[-1] == '2.xml':
+        return info_xml(parts[1])
+    elif parts[0] == 'download-info':
+        return download_info_xml(parts[1])
+    raise KeyError(url)
+
+
+class FragmentSearch(Search):
+    """Search served from generated fragments"""
+
+    def __init__(self, **kwargs):
+        super(FragmentSearch, self).__init__(**kwargs)
+        self.opened = []
+
+    def open(self, url):
+        self.opened.append(url)
+        return StringIO(fragment(url))
+
+
+class OfflineTestCase(unittest.TestCase):
+    """Empty entity caches and search_class as cursor of test thread"""
+    search_class = FragmentSearch
+
+    def clear_caches(self):
+        for cache in (
+            Search.TRACKS_CACHE, Search.ALBUMS_CACHE, Search.ARTISTS_CACHE,
+        ):
+            cache.clear()
+
+    def setUp(self):
+        self.clear_caches()
+        self.search = self.search_class()
+        self.search.__enter__()
+
+    def tearDown(self):
+        self.search.__exit__(None, None, None)
+        self.search.close()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Local stand-in of yandex music, works as http proxy for cursor:
+
+    with StandInServer(latency=0.05) as server:
+        with Search(proxy=server.proxy):
+            Artist.objects.get(id=1).get_tracks()
+"""
+
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from collections import Counter
+import threading
+import time
+from fixtures import fragment
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    wbufsize = -1  # send headers and body together
+
+    def _url(self):
+        if self.path.startswith('http'):
+            return self.path  # proxy request
+        return 'http://music.yandex.ru' + self.path
+
+    def _send(self, code, body, headers=()):
+        self.send_response(code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_track(self):
+        data = self.server.track
+        header = self.headers.getheader('Range')
+        if not header:
+            return self._send(200, data)
+        start, end = header.split('=')[1].split('-')
+        start = int(start)
+        end = int(end) + 1 if end else len(data)
+        if start >= len(data):
+            return self._send(416, '')
+        self._send(206, data[start:end], [(
+            'Content-Range', 'bytes %d-%d/%d' % (start, end - 1, len(data)),
+        )])
+
+    def do_GET(self):
+        url = self._url()
+        kind = self.server.count(url)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if kind == 'get-mp3':
+            return self._send_track()
+        try:
+            body = self.server.body(url)
+        except (KeyError, ValueError, IndexError):
+            return self._send(404, 'not found')
+        self._send(200, body, [('Content-Type', 'text/html; charset=utf-8')])
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    """Serves generated fragments, storage xml and track data or
+    recorded responses, with latency before each response, request
+    threads are joined on stop"""
+    daemon_threads = True
+    stop_timeout = 5  # seconds to wait for each request thread
+
+    def __init__(self, latency=0, track_size=256 * 1024, responses=None,
+                 address=('127.0.0.1', 0)):
+        """Create server
+
+        Keyword Arguments:
+        latency -- seconds before each response
+        track_size -- size of served track data
+        responses -- dict of url to recorded body, used before generated
+        address -- listened host and port
+        """
+        HTTPServer.__init__(self, address, StandInHandler)
+        self.latency = latency
+        self.track = ''.join(chr(num % 251) for num in range(track_size))
+        self.responses = responses or {}
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._request_threads = []
+
+    @property
+    def proxy(self):
+        return 'http://%s:%d' % self.server_address
+
+    def count(self, url):
+        """Count request by kind, returns kind"""
+        path = url.split('://', 1)[-1].split('/')
+        if path[1] == 'fragment':
+            kind = path[2].split('?')[0]
+        else:
+            kind = path[1]
+        with self._lock:
+            self.requests[kind] += 1
+        return kind
+
+    def body(self, url):
+        if url in self.responses:
+            return self.responses[url]
+        return fragment(url)
+
+    def handle_error(self, request, client_address):
+        pass  # client closes connection after partial read
+
+    def process_request(self, request, client_address):
+        thread = threading.Thread(
+            target=self.process_request_thread,
+            args=(request, client_address),
+        )
+        thread.daemon = self.daemon_threads
+        with self._lock:
+            self._request_threads = [
+                running for running in self._request_threads
+                if running.is_alive()
+            ] + [thread]
+        thread.start()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop server and wait for requests, keep-alive connections of
+        clients should be closed before it"""
+        self.shutdown()
+        self.server_close()
+        with self._lock:
+            threads, self._request_threads = self._request_threads, []
+        for thread in threads:
+            thread.join(self.stop_timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
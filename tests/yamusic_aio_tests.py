@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from StringIO import StringIO
+from tornado.concurrent import Future
+from tornado.httpclient import HTTPRequest, HTTPResponse, HTTPError
+from tornado.httputil import HTTPHeaders
+from tornado.ioloop import IOLoop
+from tornado.testing import AsyncTestCase, gen_test
+from yamusic.aio import AsyncSearch
+from yamusic.app import Search, Artist, Album, Track
+from yamusic.transport import RequestScheduler
+from yamusic.metrics import Metrics
+from fixtures import fragment
+
+
+class FakeClient(object):
+    """Tornado client served from generated fragments"""
+
+    def __init__(self, delay=False, failures=0):
+        self.fetched = []
+        self.delay = delay
+        self.failures = failures
+
+    def fetch(self, url, headers=None):
+        self.fetched.append(url)
+        future = Future()
+        if self.failures:
+            self.failures -= 1
+            future.set_exception(HTTPError(599, 'Timeout'))
+            return future
+        response = HTTPResponse(
+            HTTPRequest(url), 200,
+            headers=HTTPHeaders({'Set-Cookie': 'session=1; Path=/'}),
+            buffer=StringIO(fragment(url)),
+        )
+        if self.delay:
+            IOLoop.current().add_callback(future.set_result, response)
+        else:
+            future.set_result(response)
+        return future
+
+
+class AsyncSearchTestCase(AsyncTestCase):
+    def setUp(self):
+        super(AsyncSearchTestCase, self).setUp()
+        self.client = FakeClient()
+        self.search = AsyncSearch(client=self.client)
+
+    @gen_test
+    def test_search(self):
+        tracks = yield self.search.search(Search.TYPE_TRACKS, 'q')
+        self.assertEqual([track.id for track in tracks], range(6))
+        self.assertIsInstance(tracks[0], Track)
+        self.assertEqual(len(self.search.cookie_jar), 1)
+
+    @gen_test
+    def test_limit(self):
+        track = yield self.search.search(
+            Search.TYPE_TRACKS, 'q', single=True,
+        )
+        self.assertEqual(track.id, 0)
+        self.assertEqual(len(self.client.fetched), 1)
+
+    @gen_test
+    def test_artist(self):
+        artist = yield self.search.artists.get(id=3)
+        self.assertIsInstance(artist, Artist)
+        self.assertEqual(artist.title, 'artist 3')
+        tracks = yield self.search.get_tracks(artist)
+        self.assertEqual(len(tracks), 6)
+
+    @gen_test
+    def test_parse_metrics(self):
+        metrics = Metrics()
+        self.search = AsyncSearch(client=self.client, metrics=metrics)
+        yield self.search.artists.get(id=13)
+        self.assertEqual(metrics.snapshot()['parse']['artist']['count'], 1)
+
+    @gen_test
+    def test_album_and_url(self):
+        album = yield self.search.albums.get(id=5)
+        self.assertIsInstance(album, Album)
+        self.assertEqual(album.title, 'album 5')
+        track = yield self.search.tracks.get(id=501, album=album)
+        self.assertEqual(track.storage_dir, 'dir501')
+        url = yield self.search.url(track)
+        self.assertTrue(url.startswith('http://storage.local/get-mp3/'))
+
+    @gen_test
+    def test_coalesce(self):
+        self.search = AsyncSearch(client=FakeClient(delay=True))
+        artists = yield [
+            self.search.get_data(Artist.get(id=9)) for _ in range(3)
+        ]
+        self.assertEqual(artists, [Artist.get(id=9)] * 3)
+        self.assertEqual(len(self.search.client.fetched), 1)
+        self.assertEqual(self.search.flights.coalesced, 2)
+
+    def test_blocking_api(self):
+        self.assertRaises(
+            TypeError, self.search.result_set, Search.TYPE_TRACKS, 'q',
+        )
+        self.assertRaises(
+            TypeError, self.search.search_many, [(Search.TYPE_TRACKS, 'q')],
+        )
+        self.assertRaises(
+            TypeError, len, Track.objects.using(self.search).filter('q'),
+        )
+        self.assertRaises(
+            TypeError, Artist.objects.using(self.search).get, id=14,
+        )
+        with self.assertRaises(TypeError):
+            with self.search:
+                pass
+
+    @gen_test
+    def test_network_retry(self):
+        scheduler = RequestScheduler(backoff=0.01)
+        self.search = AsyncSearch(
+            client=FakeClient(failures=2), scheduler=scheduler,
+        )
+        artist = yield self.search.artists.get(id=12)
+        self.assertEqual(artist.title, 'artist 12')
+        self.assertEqual(scheduler.stats, {'retried': 2, 'throttled': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
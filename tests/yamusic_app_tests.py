@@ -15,8 +15,271 @@ import unittest
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-from yamusic.app import cursor, Search, Artist, Album, Track
+from yamusic import app
+from yamusic.app import (
+    cursor, Search, Artist, Album, Track, IdentityCache, hydrate,
+    get_cursor, SearchPool, TrackList, compact,
+)
+from yamusic.transport import RequestScheduler
 from itertools import islice
+from functools import partial
+from StringIO import StringIO
+import threading
+import time
+from fixtures import search_page_html, FragmentSearch
+import fixtures
+
+
+class FakeSearch(Search):
+    """Search served from generated pages"""
+
+    def __init__(self, pages_count, **kwargs):
+        super(FakeSearch, self).__init__(**kwargs)
+        self.pages_count = pages_count
+        self.opened = []
+        self._lock = threading.Lock()
+
+    def open(self, url):
+        page = int(url.split('page=')[-1])
+        with self._lock:
+            self.opened.append(page)
+        return StringIO(search_page_html(page, self.pages_count))
+
+
+class FlakySearch(FakeSearch):
+    """Generated pages, first request of failed page fails"""
+    open = Search.open
+
+    def __init__(self, pages_count, failed_page, **kwargs):
+        super(FlakySearch, self).__init__(pages_count, **kwargs)
+        self.failed_page = failed_page
+
+    def _open(self, url, headers=None):
+        page = int(url.split('page=')[-1])
+        if page == self.failed_page and page not in self.opened:
+            self.opened.append(page)
+            raise IOError('failed')
+        return FakeSearch.open(self, url)
+
+
+class OfflineTestCase(fixtures.OfflineTestCase):
+    def test_artist(self):
+        artist = Artist.objects.get(id=2)
+        self.assertEqual(artist.title, 'artist 2')
+        self.assertEqual(
+            [album.id for album in artist.get_albums()], [20, 21],
+        )
+        self.assertEqual(len(artist.get_tracks()), 6)
+
+    def test_album(self):
+        album = Album.objects.get(id=7)
+        self.assertEqual(album.title, 'album 7')
+        self.assertEqual(album.artist.title, 'artist 1')
+        self.assertEqual(
+            [track.id for track in album.get_tracks()], [700, 701, 702],
+        )
+
+    def test_track(self):
+        track = Track.objects.get(id=801, album__id=8)
+        self.assertEqual(track.storage_dir, 'dir801')
+        self.assertTrue(track.url.startswith('http://storage.local/get-mp3/'))
+
+    def test_resolve_urls(self):
+        Search.URLS_CACHE.clear()
+        tracks = Album.objects.get(id=3).get_tracks()
+        opened = len(self.search.opened)
+        urls = self.search.resolve_urls(tracks)
+        self.assertEqual(len(self.search.opened), opened + 6)
+        self.assertEqual(urls, [track.url for track in tracks])
+        self.assertEqual(len(self.search.opened), opened + 6)
+        self.assertIn('track-id=%d&' % tracks[1].id, urls[1])
+        Search.URLS_CACHE[tracks[0].storage_dir]['expires'] = time.time()
+        tracks[0].url
+        self.assertEqual(len(self.search.opened), opened + 8)
+
+    def test_hydrate_tracks(self):
+        tracks = [
+            Track.get(id=id, album=Album.get(id=id // 100))
+            for id in (3100, 3102, 3201, 3100)
+        ]
+        self.assertEqual(hydrate(tracks), tracks)
+        self.assertEqual(sorted(self.search.opened), [
+            'http://music.yandex.ru/fragment/album/31',
+            'http://music.yandex.ru/fragment/album/32',
+        ])
+        self.assertEqual(
+            [track.storage_dir for track in tracks],
+            ['dir3100', 'dir3102', 'dir3201', 'dir3100'],
+        )
+        self.assertEqual(tracks[0].album.title, 'album 31')
+
+    def test_hydrate_artists(self):
+        artists = hydrate(
+            [Artist.get(id=id) for id in (5, 6, 5)], 'albums', 'tracks',
+        )
+        self.assertEqual(len(self.search.opened), 2)
+        self.assertEqual(len(artists[1].get_tracks()), 6)
+        self.assertEqual(len(self.search.opened), 2)
+
+    def test_coalesce(self):
+        started = threading.Event()
+        release = threading.Event()
+        open = self.search.open
+
+        def slow_open(url):
+            started.set()
+            release.wait()
+            return open(url)
+        self.search.open = slow_open
+        artist = Artist.get(id=7)
+        get_data = self.search.bind(artist.get_data)
+        threads = [threading.Thread(target=get_data)]
+        threads[0].start()
+        started.wait()
+        threads += [
+            threading.Thread(target=get_data) for _ in range(3)
+        ]
+        for thread in threads[1:]:
+            thread.start()
+        while self.search.flights.coalesced < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.search.opened), 1)
+        self.assertEqual(artist.title, 'artist 7')
+        self.assertEqual(
+            [album.id for album in artist.get_albums()], [70, 71],
+        )
+
+    def test_track_from_album(self):
+        track = Track.objects.get(id=4001, album__id=40)
+        self.assertEqual(track.storage_dir, 'dir4001')
+        self.assertEqual(self.search.opened, [
+            'http://music.yandex.ru/fragment/album/40',
+        ])
+
+
+class CompactTestCase(fixtures.OfflineTestCase):
+    def tearDown(self):
+        super(CompactTestCase, self).tearDown()
+        Search.COLUMNAR_TRACKS = False
+
+    def test_slots(self):
+        album = Album.objects.get(id=7)
+        for obj in (album, album.artist, album.get_tracks()[0]):
+            self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertFalse(hasattr(album, 'artist__id'))
+
+    def test_compact(self):
+        self.assertIs(compact(u'dir' + '1'), compact('dir1'))
+        self.assertIsInstance(compact(u'dir1'), str)
+        self.assertEqual(compact(u'альбом'), u'альбом')
+        self.assertIsNone(compact(None))
+
+    def test_columnar(self):
+        Search.COLUMNAR_TRACKS = True
+        known = Track.get(id=1201)
+        tracks = Album.objects.get(id=12).get_tracks()
+        self.assertIsInstance(tracks, TrackList)
+        self.assertEqual(known.storage_dir, 'dir1201')
+        self.assertEqual(len(tracks), 3)
+        self.assertEqual([track.id for track in tracks[1:]], [1201, 1202])
+        self.assertIs(tracks[1], known)
+        Track.cache().clear()
+        track = tracks[-1]
+        self.assertIsNot(track, known)
+        self.assertEqual(track.storage_dir, 'dir1202')
+        self.assertEqual(track.duration, 180)
+        self.assertEqual(len(Artist.objects.get(id=3).get_tracks()), 6)
+
+
+class IdentityCacheTestCase(unittest.TestCase):
+    def test_lru(self):
+        cache = IdentityCache(max_size=2)
+        cache[1] = 'a'
+        cache['2'] = 'b'
+        self.assertEqual(cache.get('1'), 'a')
+        cache[3] = 'c'
+        self.assertNotIn(2, cache)
+        self.assertEqual(cache[1], 'a')
+        self.assertEqual(cache.stats['evictions'], 1)
+        self.assertEqual(cache.stats['hits'], 2)
+
+    def test_ttl(self):
+        cache = IdentityCache(ttl=0)
+        cache[1] = 'a'
+        cache._items[1] = 'a', 0
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.stats['expirations'], 1)
+
+    def test_add(self):
+        cache = IdentityCache()
+        self.assertEqual(cache.add(1, 'a'), 'a')
+        self.assertEqual(cache.add('1', 'b'), 'a')
+
+    def test_invalidate(self):
+        cache = IdentityCache()
+        cache[1] = cache[2] = 'a'
+        cache.invalidate('1')
+        self.assertNotIn(1, cache)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_cached_get(self):
+        self.assertIs(Artist.get(id=12345, title='a'), Artist.get(id='12345'))
+        Artist.cache().invalidate(12345)
+        self.assertIsNone(Artist.get(id=12345).title)
+
+
+class CursorContextTestCase(unittest.TestCase):
+    def setUp(self):
+        for cache in (
+            Search.TRACKS_CACHE, Search.ALBUMS_CACHE, Search.ARTISTS_CACHE,
+        ):
+            cache.clear()
+
+    def test_context(self):
+        search = FragmentSearch()
+        self.addCleanup(search.close)
+        self.assertIs(get_cursor(), app.cursor)
+        with search:
+            self.assertIs(get_cursor(), search)
+            artists = hydrate([Artist.get(id=id) for id in (11, 12, 13)])
+        self.assertIs(get_cursor(), app.cursor)
+        self.assertEqual(len(search.opened), 3)
+        self.assertEqual(artists[2].title, 'artist 13')
+
+    def test_using(self):
+        search = FakeSearch(3)
+        tracks = Track.objects.using(search).filter('q')
+        self.assertEqual(len(tracks), 6)
+        self.assertEqual(search.opened, [0, 2])
+        album = Album.objects.using(FragmentSearch()).get(id=14)
+        self.assertEqual(album.title, 'album 14')
+
+    def test_pool(self):
+        pool = SearchPool(3, factory=FragmentSearch)
+        used = set()
+
+        def load(id):
+            used.add(get_cursor())
+            return Artist.objects.get(id=id).title
+        titles = pool.map(load, range(20, 40))
+        pool.close()
+        self.assertEqual(titles, ['artist %d' % id for id in range(20, 40)])
+        self.assertLessEqual(len(used), 3)
+        self.assertEqual(sum(len(search.opened) for search in used), 20)
+        self.assertNotIn(app.cursor, used)
+        self.assertEqual(pool.map(load, [20]), ['artist 20'])
+        pool.close()
+
+    def test_pool_limit(self):
+        pool = SearchPool(2)
+        searches = [pool.acquire(), pool.acquire()]
+        self.assertIsNot(searches[0].cookie_jar, searches[1].cookie_jar)
+        pool.release(searches[0])
+        self.assertIs(pool.acquire(), searches[0])
 
 
 class CursorTestCase(unittest.TestCase):
@@ -175,5 +438,139 @@ class ORMTestCase(unittest.TestCase):
             )
         self.assertEqual(Track.objects.get(id=1675302, album__id=166649).title, 'Karen')
 
+
+class PrefetchTestCase(unittest.TestCase):
+    def test_order(self):
+        search = FakeSearch(10, prefetch=True, workers=3, prefetch_window=4)
+        self.addCleanup(search.close)
+        ids = [track.id for track in search.search(Search.TYPE_TRACKS, 'q')]
+        self.assertEqual(ids, range(20))
+        self.assertEqual(sorted(search.opened), range(10))
+
+    def test_same_as_sequential(self):
+        searches = FakeSearch(5), FakeSearch(5, prefetch=True)
+        ids = [
+            [track.id for track in search.search(Search.TYPE_TRACKS, 'q')]
+            for search in searches
+        ]
+        self.assertEqual(ids[0], ids[1])
+        searches[1].close()
+
+    def test_window(self):
+        search = FakeSearch(30, prefetch=True, prefetch_window=2)
+        self.addCleanup(search.close)
+        list(islice(search.search(Search.TYPE_TRACKS, 'q'), 5))
+        self.assertLessEqual(len(search.opened), 5)
+
+    def test_close(self):
+        search = FakeSearch(10, prefetch=True, workers=3)
+        list(search.search(Search.TYPE_TRACKS, 'q'))
+        workers = search.pool._pool
+        search.close()
+        self.assertFalse(any(worker.is_alive() for worker in workers))
+        self.assertEqual(len(list(search.search(Search.TYPE_TRACKS, 'q'))), 20)
+        search.close()
+
+
+class SearchManyTestCase(fixtures.OfflineTestCase):
+    search_class = partial(FragmentSearch, workers=2)
+
+    def test_search_many(self):
+        first = [
+            track.id for track in self.search.search(Search.TYPE_TRACKS, 'c')
+        ]
+        del self.search.opened[:]
+        results = dict(self.search.search_many([
+            (Search.TYPE_TRACKS, 'a'), (Search.TYPE_TRACKS, 'b'),
+            (Search.TYPE_TRACKS, 'a'),
+        ], limit=3))
+        self.assertEqual(len(results), 2)
+        self.assertEqual(
+            [track.id for track in results[Search.TYPE_TRACKS, 'a']],
+            first[:3],
+        )
+        self.assertIs(
+            results[Search.TYPE_TRACKS, 'a'][1],
+            results[Search.TYPE_TRACKS, 'b'][1],
+        )
+        self.assertEqual(sorted(
+            url.split('page=')[-1] for url in self.search.opened
+        ), ['0', '0', '1', '1'])
+        results = list(self.search.search_many(
+            [(Search.TYPE_ALBUMS, 'a')], limit=None,
+        ))
+        self.assertEqual(len(results[0][1]), 6)
+
+    def test_get_many(self):
+        found = sorted(Track.objects.get_many([
+            {'title': 'a'}, {'title': 'b', 'artist__title': 'c'},
+            {'title': 'a'},
+        ]))
+        self.assertEqual([number for number, track in found], [0, 1, 2])
+        self.assertIs(found[0][1], found[2][1])
+        self.assertEqual(len(self.search.opened), 2)
+
+
+class ResultSetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.search = FakeSearch(10)
+        self.result = self.search.result_set(Search.TYPE_TRACKS, 'q')
+
+    def test_index(self):
+        self.assertEqual(self.result[7].id, 7)
+        self.assertEqual(self.result[2].id, 2)
+        self.assertEqual(self.result[-1].id, 19)
+        self.assertEqual(self.search.opened, [0, 3, 1, 9])
+        self.assertRaises(IndexError, lambda: self.result[20])
+
+    def test_slice(self):
+        ids = [track.id for track in self.result[5:9]]
+        self.assertEqual(ids, range(5, 9))
+        self.assertEqual(self.search.opened, [0, 2, 3, 4])
+        self.assertEqual(
+            [track.id for track in self.result[17:100]], range(17, 20),
+        )
+        self.assertEqual(
+            [track.id for track in self.result[-3::-4]], range(17, -1, -4),
+        )
+
+    def test_count(self):
+        self.assertEqual(len(self.result), 20)
+        self.assertEqual(self.search.opened, [0, 9])
+
+    def test_iterate_twice(self):
+        self.assertEqual([track.id for track in self.result], range(20))
+        self.assertEqual([track.id for track in self.result], range(20))
+        self.assertEqual(self.search.opened, range(10))
+
+    def test_resume(self):
+        search = FlakySearch(3, 1)
+        result = search.result_set(Search.TYPE_TRACKS, 'q')
+        self.assertRaises(IOError, lambda: [track for track in result])
+        self.assertEqual([track.id for track in result], range(6))
+        self.assertEqual(search.opened, [0, 1, 1, 2])
+
+    def test_retry(self):
+        search = FlakySearch(3, 1, scheduler=RequestScheduler(backoff=0))
+        ids = [track.id for track in search.search(Search.TYPE_TRACKS, 'q')]
+        self.assertEqual(ids, range(6))
+        self.assertEqual(search.opened, [0, 1, 1, 2])
+
+    def test_prefetch_slice(self):
+        search = FakeSearch(10, prefetch=True, workers=3)
+        self.addCleanup(search.close)
+        result = search.result_set(Search.TYPE_TRACKS, 'q')
+        self.assertEqual([track.id for track in result[4:12]], range(4, 12))
+        self.assertEqual(sorted(search.opened), [0, 2, 3, 4, 5])
+
+    def test_manager(self):
+        with self.search:
+            tracks = Track.objects.filter('q')
+            self.assertEqual(len(tracks), 20)
+            self.assertEqual(tracks.count(), 20)
+            self.assertEqual(tracks[5].id, 5)
+            self.assertEqual(len(tracks.all()), 20)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from StringIO import StringIO
+import shutil
+import tempfile
+import time
+from yamusic.app import Search, Album
+from yamusic.covers import CoverCache
+from fixtures import FragmentSearch, OfflineTestCase
+
+
+class CoverSearch(FragmentSearch):
+    """Generated fragments and covers, covers/N.jpg has image N % 2"""
+
+    def open(self, url):
+        if not url.startswith('http://'):
+            raise ValueError('unknown url type: %s' % url)
+        if url.startswith('http://covers/'):
+            self.opened.append(url)
+            number = int(url.rsplit('/', 1)[1].split('.')[0])
+            if number < 0:
+                raise IOError('Not found')
+            return StringIO('image %d' % (number % 2))
+        return super(CoverSearch, self).open(url)
+
+
+def count_files(directory):
+    return sum(len(files) for root, dirs, files in os.walk(directory))
+
+
+class CoverCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_content_addressed(self):
+        cache = CoverCache(self.directory)
+        self.assertIsNone(cache.get('http://a/1.jpg'))
+        path = cache.put('http://a/1.jpg', 'image')
+        self.assertEqual(cache.put('http://b/2.jpg', 'image'), path)
+        self.assertEqual(cache.get('http://b/2.jpg'), path)
+        self.assertEqual(open(path).read(), 'image')
+        self.assertEqual(
+            count_files(os.path.join(self.directory, 'images')), 1,
+        )
+        self.assertEqual(cache.stats['deduplicated'], 1)
+        self.assertEqual(cache.stats['size'], 5)
+        self.assertEqual(CoverCache(self.directory).get('http://a/1.jpg'), path)
+
+    def test_eviction(self):
+        cache = CoverCache(self.directory, max_size=20)
+        cache.put('http://a/0.jpg', '0' * 8)
+        cache.put('http://a/1.jpg', '1' * 8)
+        cache.get('http://a/0.jpg')
+        cache.put('http://a/2.jpg', '2' * 8)
+        self.assertIsNone(cache.get('http://a/1.jpg'))
+        self.assertIsNotNone(cache.get('http://a/0.jpg'))
+        self.assertEqual(cache.stats['evictions'], 1)
+        self.assertEqual(cache.size, 16)
+        self.assertEqual(
+            count_files(os.path.join(self.directory, 'urls')), 2,
+        )
+        cache.clear()
+        self.assertIsNone(cache.get('http://a/2.jpg'))
+        self.assertEqual(cache.size, 0)
+
+    def test_removed_by_other_process(self):
+        cache = CoverCache(self.directory, max_size=10)
+        path = cache.put('http://a/0.jpg', '0' * 8)
+        shutil.rmtree(os.path.dirname(path))
+        self.assertEqual(cache.put('http://a/1.jpg', '0' * 8), path)
+        self.assertEqual(open(path).read(), '0' * 8)
+        os.remove(path)
+        cache.put('http://a/2.jpg', '2' * 8)
+        self.assertIsNone(cache.get('http://a/0.jpg'))
+        self.assertEqual(cache.stats['evictions'], 1)
+
+    def test_order_on_start(self):
+        cache = CoverCache(self.directory)
+        for number in range(3):
+            path = cache.put('http://a/%d.jpg' % number, '%d' % number * 8)
+            os.utime(path, (time.time() - number,) * 2)
+        cache = CoverCache(self.directory, max_size=20)
+        self.assertEqual(cache.size, 24)
+        cache.put('http://a/3.jpg', '3' * 5)
+        self.assertIsNone(cache.get('http://a/2.jpg'))
+        self.assertIsNone(cache.get('http://a/1.jpg'))
+        self.assertIsNotNone(cache.get('http://a/0.jpg'))
+
+
+class AlbumCoversTestCase(OfflineTestCase):
+    search_class = CoverSearch
+
+    def setUp(self):
+        super(AlbumCoversTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        Search.COVERS = CoverCache(self.directory)
+
+    def tearDown(self):
+        super(AlbumCoversTestCase, self).tearDown()
+        Search.COVERS = None
+        shutil.rmtree(self.directory)
+
+    def albums(self, count):
+        return [
+            Album.get(id=id, cover='http://covers/%d.jpg' % (id % 4))
+            for id in range(1, count + 1)
+        ]
+
+    def test_fetch_covers(self):
+        albums = self.albums(8)
+        covers = Album.fetch_covers(albums)
+        self.assertEqual(sorted(covers), sorted(albums))
+        self.assertEqual(len(set(covers.values())), 2)
+        self.assertEqual(open(covers[albums[0]]).read(), 'image 1')
+        self.assertEqual(len(set(self.search.opened)), 4)
+        opened = len(self.search.opened)
+        self.assertEqual(Album.fetch_covers(albums), covers)
+        self.assertEqual(len(self.search.opened), opened)
+
+    def test_iter_covers(self):
+        albums = self.albums(5) + [
+            Album.get(id=6), Album.get(id=7, cover='http://covers/-1.jpg'),
+            Album.get(id=8, cover='covers/8.jpg'),
+        ]
+        results = dict(Album.iter_covers(iter(albums)))
+        self.assertEqual(len(results), 8)
+        for album in albums[5:]:
+            self.assertIsNone(results[album])
+        self.assertEqual(albums[1].get_cover(), results[albums[1]])
+
+    def test_no_cache(self):
+        Search.COVERS = None
+        self.assertRaises(ValueError, self.albums(1)[0].get_cover)
+
+
+if __name__ == '__main__':
+    unittest.main()
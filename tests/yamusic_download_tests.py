@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+import threading
+import tempfile
+import shutil
+import time
+from yamusic.app import Search, Track
+from yamusic.downloader import Downloader
+from yamusic.transport import TokenBucket
+
+DATA = ''.join(chr(num % 251) for num in range(300 * 1024))
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # client closes connection after partial read
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    failures = 0
+    stalled = False
+    ranges = []
+    encodings = []
+
+    def do_GET(self):
+        data = DATA
+        self.encodings.append(self.headers.getheader('Accept-Encoding'))
+        start, end = 0, len(DATA)
+        header = self.headers.getheader('Range')
+        if header:
+            self.ranges.append(header)
+            start, end = header.split('=')[1].split('-')
+            start = int(start)
+            end = int(end) + 1 if end else len(DATA)
+            if start >= len(DATA):
+                self.send_response(416)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (
+                start, end - 1, len(DATA),
+            ))
+            if Handler.stalled and start:
+                end = start  # empty body
+        else:
+            self.send_response(200)
+        data = data[start:end]
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if Handler.failures and len(data) > 1:
+            Handler.failures -= 1
+            self.wfile.write(data[:len(data) // 2])
+            self.close_connection = 1
+            return
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class DownloadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'track.mp3')
+        self.search = Search()
+        self.search.__enter__()
+        self.tracks = [
+            Track(id=id, storage_dir='download-test-%d' % id)
+            for id in range(1, 5)
+        ]
+        self.track = self.tracks[0]
+        for track in self.tracks:
+            Search.URLS_CACHE[track.storage_dir] = {
+                'host': '127.0.0.1:%d' % self.server.server_port,
+                'path': '/track.mp3', 's': '', 'ts': '0',
+                'expires': time.time() + 3600,
+            }
+        Handler.failures = 0
+        Handler.stalled = False
+        Handler.ranges = []
+        Handler.encodings = []
+
+    def tearDown(self):
+        self.search.__exit__(None, None, None)
+        self.search.close()
+        for track in self.tracks:
+            Search.URLS_CACHE.invalidate(track.storage_dir)
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def _read(self):
+        with open(self.path, 'rb') as result:
+            return result.read()
+
+    def test_iter_content(self):
+        chunks = list(self.track.iter_content(1000))
+        self.assertEqual(len(chunks[0]), 1000)
+        self.assertEqual(''.join(chunks), DATA)
+        self.assertEqual(Handler.encodings, ['identity'])
+
+    def test_download(self):
+        self.track.download_to(self.path)
+        self.assertEqual(self._read(), DATA)
+        self.assertFalse(os.path.exists(self.path + '.part'))
+
+    def test_resume(self):
+        Handler.failures = 2
+        self.track.download_to(self.path, chunk_size=4096)
+        self.assertEqual(self._read(), DATA)
+        self.assertEqual(len(Handler.ranges), 3)
+        self.assertNotEqual(Handler.ranges[1], 'bytes=0-')
+
+    def test_resume_part(self):
+        with open(self.path + '.part', 'wb') as part:
+            part.write(DATA[:1000])
+        self.track.download_to(self.path)
+        self.assertEqual(self._read(), DATA)
+        self.assertEqual(Handler.ranges, ['bytes=1000-'])
+
+    def test_segments(self):
+        Handler.failures = 1
+        self.track.download_to(self.path, segments=4)
+        self.assertEqual(self._read(), DATA)
+        self.assertEqual(set(Handler.encodings), set(['identity']))
+
+    def test_resume_segments(self):
+        Handler.failures = 1
+        self.assertRaises(
+            IOError, self.track.download_to, self.path, retries=0,
+            segments=4,
+        )
+        self.assertTrue(os.path.exists(self.path + '.part.ranges'))
+        Handler.ranges = []
+        self.track.download_to(self.path, segments=4)
+        self.assertEqual(self._read(), DATA)
+        self.assertEqual(len(Handler.ranges), 1)
+        start = int(Handler.ranges[0].split('=')[1].split('-')[0])
+        self.assertNotEqual(start % (len(DATA) // 4 + 1), 0)
+        self.assertFalse(os.path.exists(self.path + '.part.ranges'))
+
+    def test_resume_segments_in_one_stream(self):
+        Handler.failures = 1
+        self.assertRaises(
+            IOError, self.track.download_to, self.path, retries=0,
+            segments=4,
+        )
+        self.track.download_to(self.path)
+        self.assertEqual(self._read(), DATA)
+        self.assertFalse(os.path.exists(self.path + '.part.ranges'))
+
+    def test_broken_ranges(self):
+        with open(self.path + '.part', 'wb') as part:
+            part.truncate(len(DATA))
+        with open(self.path + '.part.ranges', 'w') as ranges:
+            ranges.write('broken')
+        self.track.download_to(self.path)
+        self.assertEqual(self._read(), DATA)
+
+    def test_no_progress(self):
+        Handler.stalled = True
+        self.assertRaises(
+            IOError, self.track.download_to, self.path, retries=1,
+            segments=2,
+        )
+
+    def test_downloader(self):
+        progress = {}
+        downloader = Downloader(
+            self.dir, workers=2,
+            on_progress=lambda track, size: progress.__setitem__(
+                track.id, size,
+            ),
+        )
+        paths = downloader.download(self.tracks)
+        self.assertEqual(len(paths), 4)
+        self.assertEqual(progress, dict(
+            (track.id, len(DATA)) for track in self.tracks
+        ))
+        self.assertEqual(downloader.downloaded_bytes, len(DATA) * 4)
+        requests = len(Handler.ranges)
+        self.assertEqual(len(downloader.download(self.tracks)), 4)
+        self.assertEqual(len(Handler.ranges), requests)
+        self.assertEqual(len(downloader.skipped), 4)
+
+    def test_downloader_error(self):
+        errors = []
+        Search.URLS_CACHE[self.track.storage_dir]['host'] = '127.0.0.1:1'
+        downloader = Downloader(
+            self.dir, retries=0,
+            on_error=lambda track, e: errors.append(track),
+        )
+        self.assertEqual(downloader.download([self.track]), [])
+        self.assertEqual(errors, [self.track])
+
+    def test_downloader_no_storage_dir(self):
+        errors = []
+        downloader = Downloader(
+            self.dir, on_error=lambda track, e: errors.append(track),
+        )
+        broken = Track(id=9)
+        paths = downloader.download([broken, self.track])
+        self.assertEqual(paths, [os.path.join(self.dir, '1.mp3')])
+        self.assertEqual(errors, [broken])
+
+
+class TokenBucketTestCase(unittest.TestCase):
+    def test_rate(self):
+        bucket = TokenBucket(1000, burst=100)
+        started = time.time()
+        for _ in range(3):
+            bucket.consume(100)
+        self.assertGreaterEqual(time.time() - started, 0.15)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from hashlib import md5
+import threading
+import tempfile
+import shutil
+import time
+from yamusic.app import Search
+from yamusic.http_cache import ResponseCache
+from yamusic.transport import RequestScheduler
+from yamusic.metrics import Metrics
+from fixtures import fragment
+
+
+class Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        body = fragment('http://music.yandex.ru' + self.path)
+        etag = '"%s"' % md5(body).hexdigest()
+        self.requests.append(self.path)
+        if self.headers.getheader('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.dir = tempfile.mkdtemp()
+        self.url = 'http://127.0.0.1:%d/fragment/album/%%d' % (
+            self.server.server_port,
+        )
+        Handler.requests = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def _search(self, ttl, **kwargs):
+        return Search(response_cache=ResponseCache(
+            rules=[(r'/fragment/album/', ttl)], **kwargs
+        ))
+
+    def test_hit(self):
+        search = self._search(60)
+        first = search.open(self.url % 1).read()
+        self.assertEqual(search.open(self.url % 1).read(), first)
+        self.assertEqual(len(Handler.requests), 1)
+        self.assertEqual(search.response_cache.stats['hits'], 1)
+
+    def test_revalidate(self):
+        search = self._search(0)
+        first = search.open(self.url % 1).read()
+        response = search.open(self.url % 1)
+        self.assertEqual(response.read(), first)
+        self.assertEqual(response.getcode(), 200)
+        self.assertEqual(len(Handler.requests), 2)
+        self.assertEqual(search.response_cache.stats['revalidated'], 1)
+
+    def test_disk(self):
+        first = self._search(60, directory=self.dir).open(self.url % 2).read()
+        search = self._search(60, directory=self.dir)
+        self.assertEqual(search.open(self.url % 2).read(), first)
+        self.assertEqual(len(Handler.requests), 1)
+
+    def test_hit_not_scheduled(self):
+        metrics = Metrics()
+        search = Search(
+            response_cache=ResponseCache(rules=[(r'/fragment/album/', 60)]),
+            metrics=metrics, scheduler=RequestScheduler(
+                limits={'fragment': {'rate': 2, 'burst': 1}},
+            ),
+        )
+        started = time.time()
+        for _ in range(6):
+            search.open(self.url % 1).read()
+        self.assertLess(time.time() - started, 1)
+        self.assertEqual(len(Handler.requests), 1)
+        self.assertEqual(
+            metrics.snapshot()['requests']['fragment']['count'], 1,
+        )
+
+    def test_disk_size(self):
+        search = self._search(60, directory=self.dir, disk_size=1)
+        for id in range(3):
+            search.open(self.url % id).read()
+        self.assertEqual(len(os.listdir(self.dir)), 1)
+        self.assertEqual(search.response_cache.stats['evictions'], 2)
+        self.assertEqual(
+            search.response_cache.used_disk,
+            os.path.getsize(os.path.join(self.dir, os.listdir(self.dir)[0])),
+        )
+
+    def test_clear(self):
+        search = self._search(60, directory=self.dir)
+        search.open(self.url % 1).read()
+        with open(os.path.join(self.dir, 'other.txt'), 'w') as other:
+            other.write('other')
+        search.response_cache.clear()
+        self.assertEqual(os.listdir(self.dir), ['other.txt'])
+        self.assertEqual(search.response_cache.used_disk, 0)
+
+    def test_bypass(self):
+        search = Search(response_cache=ResponseCache(rules=[]))
+        search.open(self.url % 1).read()
+        search.open(self.url % 1).read()
+        self.assertEqual(len(Handler.requests), 2)
+        self.assertEqual(search.response_cache.stats['bypassed'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
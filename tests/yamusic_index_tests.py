@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from yamusic.app import Search, Artist, Album, Track
+from yamusic.index import LocalIndex, tokenize
+from fixtures import OfflineTestCase
+
+
+class TokenizeTestCase(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize(u'Ёлка, ЁЖ-и', 'Royksopp', None, 'Жёлтый'),
+            [u'елка', u'еж', u'и', u'royksopp', u'желтый'],
+        )
+
+
+class LocalIndexTestCase(OfflineTestCase):
+    def setUp(self):
+        super(LocalIndexTestCase, self).setUp()
+        Search.INDEX = LocalIndex()
+
+    def tearDown(self):
+        super(LocalIndexTestCase, self).tearDown()
+        Search.INDEX = None
+
+    def test_index(self):
+        Album.objects.get(id=7)
+        self.assertEqual(len(Search.INDEX), 5)
+        self.assertEqual(
+            [track.id for track in Search.INDEX.search(
+                Search.TYPE_TRACKS, 'ART 1 alb 7 track 70',
+            )],
+            [700, 701, 702],
+        )
+        self.assertEqual(
+            Search.INDEX.search(Search.TYPE_ALBUMS, u'album 7'),
+            [Album.get(id=7)],
+        )
+        self.assertEqual(
+            Search.INDEX.search(Search.TYPE_TRACKS, 'track 8'), [],
+        )
+        self.assertEqual(
+            len(Search.INDEX.search(Search.TYPE_TRACKS, 'track', limit=2)), 2,
+        )
+
+    def test_reindex(self):
+        artist = Artist.get(id=3)
+        self.assertEqual(
+            Search.INDEX.search(Search.TYPE_ARTISTS, 'artist'), [],
+        )
+        artist.get_data()
+        self.assertEqual(
+            Search.INDEX.search(Search.TYPE_ARTISTS, 'artist'), [artist],
+        )
+        Artist.cache().invalidate(3)
+        self.assertEqual(
+            Search.INDEX.search(Search.TYPE_ARTISTS, 'artist'), [],
+        )
+        self.assertEqual(len(Search.INDEX), 8)
+
+    def test_filter(self):
+        Album.objects.get(id=7)
+        opened = len(self.search.opened)
+        tracks = Track.objects.filter(
+            title='track 701', artist__title='artist 1', local=True,
+        )
+        self.assertEqual([track.id for track in tracks], [701])
+        self.assertEqual(len(tracks), 1)
+        self.assertEqual(
+            Track.objects.get(title='track 702', local=True).id, 702,
+        )
+        self.assertEqual(len(self.search.opened), opened)
+        self.assertEqual(Search.INDEX.hits, 2)
+        tracks = Track.objects.filter(title='missing', local=True)
+        self.assertEqual(len(list(tracks)), 6)
+        self.assertGreater(len(self.search.opened), opened)
+        self.assertEqual(Search.INDEX.misses, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
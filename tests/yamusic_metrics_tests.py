@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from StringIO import StringIO
+import tempfile
+import shutil
+from yamusic.app import Search, Album
+from yamusic.metrics import Histogram, Metrics, profile
+from fixtures import fragment
+
+
+class GeneratedSearch(Search):
+    """Search opening generated fragments"""
+
+    def _open(self, url, headers=None):
+        if 'missing' in url:
+            raise IOError('missing')
+        return StringIO(fragment(url))
+
+
+class HistogramTestCase(unittest.TestCase):
+    def test_snapshot(self):
+        histogram = Histogram((1, 2))
+        for value in (0.5, 1, 1.5, 3):
+            histogram.observe(value)
+        self.assertEqual(histogram.snapshot(), {
+            'buckets': [(1, 2), (2, 3), ('inf', 4)], 'count': 4, 'sum': 6.0,
+        })
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+        self.events = []
+        self.metrics.add_hook(lambda event, data: self.events.append(event))
+        self.search = GeneratedSearch(metrics=self.metrics)
+        Search.ALBUMS_CACHE.clear()
+        self.metrics.watch('albums', Search.ALBUMS_CACHE)
+
+    def tearDown(self):
+        Search.ALBUMS_CACHE.on_lookup = None
+
+    def test_album(self):
+        url = 'http://music.yandex.ru/fragment/album/51'
+        with self.search:
+            Album.objects.get(id=51)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['requests']['fragment']['count'], 1)
+        self.assertEqual(snapshot['bytes'], {'fragment': len(fragment(url))})
+        self.assertEqual(snapshot['parse']['album']['count'], 1)
+        self.assertGreaterEqual(snapshot['parse']['album']['sum'], 0)
+        self.assertEqual(snapshot['caches']['albums']['misses'], 1)
+        self.assertEqual(
+            self.events, ['cache', 'request', 'response', 'parse'],
+        )
+
+    def test_search(self):
+        list(self.search.search(Search.TYPE_TRACKS, 'q'))
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['requests']['search']['count'], 3)
+        self.assertEqual(snapshot['parse']['search']['count'], 3)
+
+    def test_error(self):
+        self.assertRaises(
+            IOError, self.search.open, 'http://music.yandex.ru/missing',
+        )
+        self.assertEqual(self.metrics.snapshot()['errors'], {'default': 1})
+
+
+class ProfileTestCase(unittest.TestCase):
+    def test_print(self):
+        stream = StringIO()
+        with profile(stream=stream, limit=5):
+            sorted(range(1000), reverse=True)
+        self.assertIn('function calls', stream.getvalue())
+
+    def test_dump(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'stats')
+            with profile(path):
+                sorted(range(1000))
+            self.assertTrue(os.path.getsize(path))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
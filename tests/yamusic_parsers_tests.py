@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from yamusic.app import Artist, hydrate
+from yamusic.parsers import (
+    SoupParser, FastParser, ProcessParser, fix_json_single_quotes, loads_js,
+    tokenize_js,
+)
+import json
+from fixtures import (
+    search_page_html, artist_html, album_html, track_fragment_html,
+    FragmentSearch,
+)
+
+PAGER_WITH_DOTS = (
+    '<a class="b-pager__page">1</a><a class="b-pager__page">2</a>'
+    '<a class="b-pager__page">7</a><a class="b-pager__page">\xe2\x80\xa6</a>'
+    '<B CLASS="b-pager__current">2</B>'
+)
+
+CYRILLIC_ALBUM = (
+    '<div class="b-title__artist">\n'
+    '  <a href="/artist/5" title="&quot;x&quot;">\xd0\x90\xd1\x80\xd1\x82'
+    ' &amp; <span>co</span></a>\n</div>\n'
+    '<h1 class="b-title__title"\n>\xd0\x90\xd0\xbb\xd1\x8c\xd0\xb1\xd0\xbe\xd0\xbc</h1>\n'
+    '<div class="b-track js-track" onclick="return {&quot;id&quot;: 1, '
+    '&quot;title&quot;: &quot;\xd0\xa2\xd1\x80\xd0\xb5\xd0\xba &amp; co&quot;, '
+    '&quot;storage_dir&quot;: &quot;d&quot;, &quot;duration&quot;: 1}"></div>'
+)
+
+CYRILLIC_ARTIST = (
+    '<h1 class="b-title__title">\xd0\x90\xd1\x80\xd1\x82</h1>'
+    '<div class="b-album-control" onclick="return {\'id\': 1, '
+    '\'title\': \'\xd0\x90 \\\'quoted\\\' "x"\', \'cover\': \'c\', \'tracks\': []}">'
+    '</div><div class="b-album-control" onclick="return broken"></div>'
+)
+
+
+class ParsersEquivalenceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.soup = SoupParser()
+        self.fast = FastParser()
+
+    def assertSame(self, method, *args):
+        self.assertEqual(
+            getattr(self.fast, method)(*args),
+            getattr(self.soup, method)(*args),
+        )
+
+    def test_search(self):
+        for type in ('tracks', 'albums', 'artists'):
+            self.assertSame('search', type, search_page_html(1, 5, 3, type))
+            self.assertSame('search', type, search_page_html(0, 0, 3, type))
+
+    def test_pager(self):
+        self.assertSame('search', 'tracks', PAGER_WITH_DOTS)
+        self.assertEqual(
+            self.fast.search('tracks', PAGER_WITH_DOTS)['pages_count'], 7,
+        )
+
+    def test_artist(self):
+        self.assertSame('artist', artist_html(3))
+        self.assertSame('artist', CYRILLIC_ARTIST)
+
+    def test_album(self):
+        self.assertSame('album', album_html(4, 2))
+        self.assertSame('album', CYRILLIC_ALBUM)
+
+    def test_track(self):
+        self.assertSame('track', track_fragment_html(10, 2))
+
+
+class ProcessParserTestCase(unittest.TestCase):
+    def setUp(self):
+        self.fast = FastParser()
+        self.process = ProcessParser(processes=2)
+
+    def tearDown(self):
+        self.process.close()
+
+    def test_records(self):
+        for method, args in (
+            ('search', ('albums', search_page_html(1, 5, 3, 'albums'))),
+            ('artist', (CYRILLIC_ARTIST,)),
+            ('album', (album_html(4, 2),)),
+            ('track', (track_fragment_html(10, 2),)),
+        ):
+            self.assertEqual(
+                getattr(self.process, method)(*args),
+                getattr(self.fast, method)(*args),
+            )
+
+    def test_map(self):
+        fragments = [album_html(id) for id in range(1, 6)]
+        self.assertEqual(
+            self.process.map('album', fragments),
+            [self.fast.album(data) for data in fragments],
+        )
+
+    def test_crawl(self):
+        search = FragmentSearch(parser=self.process)
+        self.addCleanup(search.close)
+        with search:
+            artists = hydrate(
+                [Artist.get(id=id) for id in range(60, 64)], 'tracks',
+            )
+        self.assertEqual(
+            [len(artist.get_tracks()) for artist in artists], [6] * 4,
+        )
+        self.assertEqual(artists[0].title, 'artist 60')
+
+
+JS_LITERALS = (
+    '{"id": 1, "title": "it\'s", "list": [1, 2.5, -3e2, true, null]}',
+    "{'id': 1, 'title': 'say \\'hi\\' \"x\"', 'tracks': [{'a': []}]}",
+    "{'title': '\xd0\x90\\u0410', 'cover': 'http://c/1.jpg'}",
+    u"{'title': '\u0410 \\'q\\'', 'id': 2}",
+    "{'title': 'back\\\\slash \\'q\\'', 'id': 3}",
+)
+
+
+class JsLiteralTestCase(unittest.TestCase):
+    def test_regex_equivalence(self):
+        for text in JS_LITERALS:
+            expected = json.loads(fix_json_single_quotes(text))
+            self.assertEqual(loads_js(text), expected)
+            self.assertEqual(tokenize_js(text), expected)
+
+    def test_edge_cases(self):
+        self.assertEqual(
+            loads_js("{id: 1, 'a': \"it's\", \"b\": '\\\\', c: [1,],}"),
+            {'id': 1, 'a': "it's", 'b': '\\', 'c': [1]},
+        )
+        self.assertEqual(loads_js("{'a': 'x\\\"y'}"), {'a': 'x"y'})
+        self.assertEqual(loads_js("{'a': undefined}"), {'a': None})
+
+    def test_errors(self):
+        for text in ('broken', '{', "{'a': 'b}", '[1]]', '1 2', '{a: b}'):
+            self.assertRaises(ValueError, loads_js, text)
+
+
+if __name__ == '__main__':
+    unittest.main()
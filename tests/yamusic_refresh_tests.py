@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from StringIO import StringIO
+from yamusic.app import Artist, Album
+from yamusic.refresh import Refresher
+from fixtures import FragmentSearch, OfflineTestCase
+import fixtures
+
+
+class ChangingSearch(FragmentSearch):
+    """Generated fragments with replaced parts"""
+
+    def __init__(self, **kwargs):
+        super(ChangingSearch, self).__init__(**kwargs)
+        self.replaces = {}
+
+    def open(self, url):
+        data = super(ChangingSearch, self).open(url).read()
+        for old, new in self.replaces.items():
+            data = data.replace(old, new)
+        return StringIO(data)
+
+
+def ids(objects):
+    return sorted(obj.id for obj in objects)
+
+
+class RefresherTestCase(OfflineTestCase):
+    search_class = ChangingSearch
+
+    def setUp(self):
+        super(RefresherTestCase, self).setUp()
+        self.refresher = Refresher()
+
+    def tearDown(self):
+        super(RefresherTestCase, self).tearDown()
+        fixtures.TRACKS_PER_ALBUM = 3
+        fixtures.ALBUMS_PER_ARTIST = 2
+
+    def test_artist(self):
+        artist = Artist.get(id=2)
+        changes = self.refresher.refresh([artist])
+        self.assertEqual(ids(changes.albums['added']), [20, 21])
+        self.assertEqual(len(changes.tracks['added']), 6)
+        self.assertEqual(len(artist.get_tracks()), 6)
+        changes = self.refresher.refresh([artist])
+        self.assertFalse(changes)
+        self.assertEqual(changes.unchanged, [artist])
+
+    def test_changes(self):
+        artist = Artist.get(id=3)
+        self.refresher.refresh([artist])
+        album = artist.get_albums()[1]
+        tracks = album.get_tracks()
+        fixtures.TRACKS_PER_ALBUM = 4
+        self.search.replaces = {'dir3001': 'moved'}
+        changes = self.refresher.refresh([artist])
+        self.assertEqual(ids(changes.albums['changed']), [30, 31])
+        self.assertEqual(ids(changes.tracks['added']), [3003, 3103])
+        self.assertEqual(ids(changes.tracks['changed']), [3001])
+        self.assertEqual(changes.tracks['changed'][0].storage_dir, 'moved')
+        self.assertEqual(len(artist.get_tracks()), 8)
+        self.search.replaces = {}
+        fixtures.ALBUMS_PER_ARTIST = 1
+        changes = self.refresher.refresh([artist])
+        self.assertEqual(ids(changes.albums['removed']), [31])
+        self.assertEqual(
+            ids(changes.tracks['removed']), [3100, 3101, 3102, 3103],
+        )
+        self.assertEqual(ids(changes.tracks['changed']), [3001])
+        self.assertIs(album.get_tracks()[0], tracks[0])
+
+    def test_unchanged_albums(self):
+        artist = Artist.get(id=4)
+        self.refresher.refresh([artist])
+        tracks = artist.get_albums()[0].get_tracks()
+        self.search.replaces = {'dir4101': 'moved'}
+        changes = self.refresher.refresh([artist])
+        self.assertEqual(ids(changes.albums['changed']), [41])
+        self.assertIs(artist.get_albums()[0].get_tracks(), tracks)
+
+    def test_album(self):
+        album = Album.get(id=7)
+        changes = self.refresher.refresh([album])
+        self.assertEqual(changes.albums['added'], [album])
+        self.assertEqual(ids(changes.tracks['added']), [700, 701, 702])
+        self.assertFalse(self.refresher.refresh([album]))
+        self.assertEqual(len(self.search.opened), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import tempfile
+import shutil
+from yamusic.app import Search, Artist, Track
+from yamusic.downloader import Downloader
+from server import StandInServer
+
+
+class StandInTestCase(unittest.TestCase):
+    def setUp(self):
+        for cache in (
+            Search.TRACKS_CACHE, Search.ALBUMS_CACHE, Search.ARTISTS_CACHE,
+            Search.URLS_CACHE,
+        ):
+            cache.clear()
+        self.server = StandInServer(track_size=10000).start()
+        self.search = Search(proxy=self.server.proxy)
+
+    def tearDown(self):
+        self.search.close()
+        self.server.stop()
+
+    def test_search(self):
+        with self.search:
+            tracks = Track.objects.filter('q')
+            self.assertEqual([track.id for track in tracks], range(6))
+        self.assertEqual(self.server.requests, {'search': 3})
+
+    def test_crawl_and_download(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with self.search:
+                tracks = Artist.objects.get(id=4).get_tracks()
+                paths = Downloader(directory).download(tracks)
+            self.assertEqual(len(paths), 6)
+            with open(paths[0], 'rb') as track:
+                self.assertEqual(track.read(), self.server.track)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(self.server.requests, {
+            'artist': 1, 'get': 6, 'download-info': 6, 'get-mp3': 6,
+        })
+
+    def test_recorded(self):
+        url = 'http://music.yandex.ru/fragment/artist/5/tracks'
+        self.server.responses[url] = (
+            '<h1 class="b-title__title">recorded</h1>'
+        )
+        with self.search:
+            self.assertEqual(Artist.objects.get(id=5).title, 'recorded')
+
+
+if __name__ == '__main__':
+    unittest.main()
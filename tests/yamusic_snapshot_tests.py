@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import tempfile
+import shutil
+from yamusic import snapshot
+from yamusic.app import Search, Artist, Album, Track, hydrate
+from yamusic.snapshot import Snapshot
+from fixtures import OfflineTestCase
+
+
+class SnapshotTestCase(OfflineTestCase):
+    def setUp(self):
+        super(SnapshotTestCase, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'catalog.snap')
+        hydrate([Artist.get(id=2), Album.get(id=7)], 'tracks')
+        self.counts = snapshot.dump(self.path)
+        self.clear_caches()
+
+    def tearDown(self):
+        super(SnapshotTestCase, self).tearDown()
+        Search.STORAGE = None
+        Search.COLUMNAR_TRACKS = False
+        shutil.rmtree(self.dir)
+
+    def test_dump(self):
+        self.assertEqual(self.counts, {'artist': 1, 'album': 3, 'track': 9})
+
+    def test_load(self):
+        loaded = snapshot.load(self.path)
+        self.assertEqual(loaded.counts, self.counts)
+        self.assertEqual(len(Search.TRACKS_CACHE), 0)
+        opened = len(self.search.opened)
+        artist = Artist.objects.get(id=2)
+        self.assertEqual(artist.title, 'artist 2')
+        self.assertEqual(
+            [album.id for album in artist.get_albums()], [20, 21],
+        )
+        self.assertEqual(len(artist.get_tracks()), 6)
+        track = Track.objects.get(id=701, album__id=7)
+        self.assertEqual(track.storage_dir, 'dir701')
+        self.assertEqual(track.album.artist.title, 'artist 1')
+        self.assertEqual(len(self.search.opened), opened)
+        loaded.close()
+
+    def test_track(self):
+        Search.STORAGE = Snapshot(self.path, use_mmap=False)
+        track = Track.get(id=2101)
+        track.get_data()
+        self.assertEqual(track.storage_dir, 'dir2101')
+        self.assertEqual(track.album.title, 'album 21')
+        self.assertIsNone(Search.STORAGE.load('track', 5))
+
+    def test_invalidate(self):
+        storage = Snapshot(self.path)
+        storage.invalidate('album', '7')
+        self.assertIsNone(storage.load('album', 7))
+        self.assertEqual(storage.load('album', 20)['title'], 'album 20')
+        storage.clear()
+        self.assertIsNone(storage.load('album', 20))
+
+    def test_columnar(self):
+        Search.COLUMNAR_TRACKS = True
+        hydrate([Album.get(id=7)])
+        snapshot.dump(self.path)
+        self.assertEqual(
+            Snapshot(self.path).load('album', 7)['tracks'][1],
+            {'id': 701, 'title': 'track 701', 'duration': 180,
+             'storage_dir': 'dir701'},
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from multiprocessing import Process
+import tempfile
+import shutil
+from yamusic.app import Search, Artist, Album
+from yamusic.storage import SQLiteStorage
+from fixtures import OfflineTestCase
+
+
+def save_records(path, start):
+    storage = SQLiteStorage(path)
+    for id in range(start, start + 50):
+        storage.save('track', id, {'title': 'track %d' % id})
+
+
+class SQLiteStorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cache.db')
+        self.storage = SQLiteStorage(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_load_save(self):
+        self.assertIsNone(self.storage.load('album', 1))
+        self.storage.save('album', '1', {'title': 'album'})
+        self.assertEqual(self.storage.load('album', 1), {'title': 'album'})
+        self.storage.invalidate('album', 1)
+        self.assertIsNone(self.storage.load('album', 1))
+
+    def test_max_age(self):
+        self.storage.save('album', 1, {})
+        self.storage.save('artist', 1, {})
+        self.storage.max_age = {'album': -1}
+        self.assertIsNone(self.storage.load('album', 1))
+        self.assertEqual(self.storage.load('artist', 1), {})
+
+    def test_processes(self):
+        processes = [
+            Process(target=save_records, args=(self.path, start))
+            for start in (0, 50, 100)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.storage.connection.execute(
+            'SELECT COUNT(*) FROM records',
+        ).fetchone()[0], 150)
+
+
+class StoredEntitiesTestCase(OfflineTestCase):
+    def setUp(self):
+        super(StoredEntitiesTestCase, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        Search.STORAGE = SQLiteStorage(os.path.join(self.dir, 'cache.db'))
+
+    def tearDown(self):
+        super(StoredEntitiesTestCase, self).tearDown()
+        Search.STORAGE = None
+        shutil.rmtree(self.dir)
+
+    def test_get_data(self):
+        Artist(id=4).get_data()
+        Album(id=9).get_data()
+        opened = len(self.search.opened)
+        artist = Artist(id=4)
+        artist.get_data()
+        album = Album(id=9)
+        album.get_data()
+        self.assertEqual(len(self.search.opened), opened)
+        self.assertEqual(artist.title, 'artist 4')
+        self.assertEqual(len(artist.get_tracks()), 6)
+        self.assertEqual(
+            [track.id for track in album.get_tracks()], [900, 901, 902],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from multiprocessing.pool import ThreadPool
+import threading
+import zlib
+from yamusic.app import Search
+from yamusic.transport import SingleFlight, RequestScheduler, ConnectionPool
+import urllib2
+from fixtures import fragment
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    clients = []
+
+    def do_GET(self):
+        body = fragment('http://music.yandex.ru' + self.path)
+        self.clients.append(self.client_address)
+        self.send_response(200)
+        if 'gzip' in self.headers.getheader('Accept-Encoding', ''):
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            body = compressor.compress(body) + compressor.flush()
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Set-Cookie', 'session=1; Path=/')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThrottlingHandler(Handler):
+    failures = 0
+
+    def do_GET(self):
+        if self.path.startswith('/missing'):
+            self.send_error(404)
+        elif ThrottlingHandler.failures:
+            ThrottlingHandler.failures -= 1
+            body = 'slow down'
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            Handler.do_GET(self)
+
+
+class KeepAliveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingServer(('127.0.0.1', 0), ThrottlingHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/fragment/album/%%d' % (
+            self.server.server_port,
+        )
+        Handler.clients = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuse(self):
+        search = Search()
+        self.addCleanup(search.close)
+        for id in range(5):
+            self.assertEqual(
+                search.open(self.url % id).read(),
+                fragment(self.url % id),
+            )
+        self.assertEqual(len(set(Handler.clients)), 1)
+        self.assertEqual(len(search.cookie_jar), 1)
+
+    def test_partial_read(self):
+        search = Search()
+        self.addCleanup(search.close)
+        search.open(self.url % 1).read(10)
+        self.assertEqual(
+            search.open(self.url % 2).read(), fragment(self.url % 2),
+        )
+
+    def test_threads(self):
+        search = Search(max_connections=2)
+        self.addCleanup(search.close)
+        pool = ThreadPool(8)
+        bodies = pool.map(
+            lambda id: search.open(self.url % id).read(), range(40),
+        )
+        pool.close()
+        self.assertEqual(bodies, [fragment(self.url % id) for id in range(40)])
+        self.assertLessEqual(len(set(Handler.clients)), 2)
+
+    def test_error_released(self):
+        search = Search(max_connections=1)
+        self.addCleanup(search.close)
+        with self.assertRaises(urllib2.HTTPError) as context:
+            search.open(self.url.replace('fragment', 'missing') % 1)
+        self.assertEqual(context.exception.code, 404)
+        self.assertEqual(
+            search.open(self.url % 2).read(), fragment(self.url % 2),
+        )
+
+    def test_acquire_timeout(self):
+        pool = ConnectionPool(max_per_host=1, acquire_timeout=0.05)
+        connection = pool.acquire('http', 'host')
+        self.assertRaises(urllib2.URLError, pool.acquire, 'http', 'host')
+        pool.release('http', 'host', connection)
+        self.assertIs(pool.acquire('http', 'host'), connection)
+
+    def test_disabled(self):
+        search = Search(keep_alive=False)
+        self.addCleanup(search.close)
+        search.open(self.url % 1).read()
+        search.open(self.url % 2).read()
+        self.assertEqual(len(set(Handler.clients)), 2)
+
+
+class RequestSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingServer(('127.0.0.1', 0), ThrottlingHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/fragment/album/1' % (
+            self.server.server_port,
+        )
+        self.scheduler = RequestScheduler(backoff=0.01, limits={
+            'fragment': {'rate': 100, 'retries': 3},
+        })
+        self.search = Search(scheduler=self.scheduler, max_connections=1)
+
+    def tearDown(self):
+        ThrottlingHandler.failures = 0
+        self.search.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retry(self):
+        ThrottlingHandler.failures = 3
+        self.assertEqual(self.search.open(self.url).read(), fragment(self.url))
+        self.assertEqual(self.scheduler.stats, {'retried': 3, 'throttled': 3})
+        self.assertEqual(self.scheduler.bucket(self.url).rate, 25)
+
+    def test_retries_exceeded(self):
+        ThrottlingHandler.failures = 4
+        with self.assertRaises(urllib2.HTTPError) as context:
+            self.search.open(self.url)
+        self.assertEqual(context.exception.code, 503)
+        self.assertEqual(self.scheduler.retried, 3)
+
+    def test_not_retried(self):
+        with self.assertRaises(urllib2.HTTPError) as context:
+            self.search.open(self.url.replace('fragment', 'missing'))
+        self.assertEqual(context.exception.code, 404)
+        self.assertEqual(self.scheduler.retried, 0)
+        self.assertEqual(self.search.open(self.url).read(), fragment(self.url))
+
+    def test_classify(self):
+        self.assertEqual(self.scheduler.classify(
+            'http://music.yandex.ru/fragment/search?text=q&type=tracks',
+        ), 'search')
+        self.assertEqual(self.scheduler.classify(
+            'http://storage.music.yandex.ru/get/dir/2.xml',
+        ), 'storage')
+        self.assertEqual(self.scheduler.classify(self.url), 'fragment')
+        self.assertEqual(self.scheduler.classify('http://x/'), 'default')
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+
+    def _slow(self, value):
+        self.calls.append(value)
+        self.started.set()
+        self.release.wait()
+        if value is None:
+            raise ValueError('failed')
+        return value
+
+    def _run(self, value, count=4):
+        pool = ThreadPool(count)
+        results = [pool.apply_async(
+            self.flights.do, ('key', self._slow, value),
+        )]
+        self.started.wait()
+        results += [
+            pool.apply_async(self.flights.do, ('key', self._slow, value))
+            for _ in range(count - 1)
+        ]
+        while self.flights.coalesced < count - 1:
+            threading.Event().wait(0.01)
+        self.release.set()
+        pool.close()
+        return results
+
+    def test_coalesce(self):
+        results = self._run(1)
+        self.assertEqual([result.get() for result in results], [1] * 4)
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(self.flights.stats, {'calls': 1, 'coalesced': 3})
+        self.assertEqual(self.flights.do('key', lambda: 2), 2)
+
+    def test_error(self):
+        for result in self._run(None):
+            self.assertRaises(ValueError, result.get)
+        self.assertEqual(self.calls, [None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Non-blocking cursor, requires tornado"""
+
+from tornado import gen
+from tornado.httpclient import AsyncHTTPClient, HTTPError
+import urllib2
+import httplib
+import time
+from itertools import chain
+from .app import Search, Artist, Album, Track
+
+
+class _CookieResponse(object):
+    """Tornado headers wrapper for cookielib"""
+
+    def __init__(self, headers):
+        self._headers = headers
+
+    def info(self):
+        return self
+
+    def getheaders(self, name):
+        return self._headers.get_list(name)
+
+
+class AsyncManager(object):
+    """Manager with coroutines instead of blocking calls"""
+
+    def __init__(self, search, model):
+        self.search = search
+        self.model = model
+
+    @gen.coroutine
+    def _get_titles(self, **kwargs):
+        titles = []
+        for cls in self.model.objects.search_cls:
+            cls_name = cls.__name__.lower()
+            title = kwargs.get(cls_name + '__title', '')
+            id = kwargs.get(cls_name + '__id', None)
+            obj = kwargs.get(cls_name)
+            if not title:
+                if id and not obj:
+                    obj = yield self.search.objects(cls).get(id=id)
+                if obj:
+                    title = obj.title
+            titles.append(title or '')
+        raise gen.Return(' '.join(titles))
+
+    @gen.coroutine
+    def filter(self, title='', limit=None, **kwargs):
+        """Search items, returns list with at most limit items"""
+        titles = yield self._get_titles(**kwargs)
+        if title:
+            titles = ' '.join([titles, title])
+        result = yield self.search.search(
+            self.model.objects.type, titles, limit=limit,
+        )
+        raise gen.Return(result)
+
+    @gen.coroutine
+    def get(self, title='', id=None, **kwargs):
+        if id and self.model is Track:
+            track = yield self._get_track(id, **kwargs)
+            raise gen.Return(track)
+        elif id:
+            obj = self.model.get(id=id)
+            yield self.search.get_data(obj)
+            raise gen.Return(obj)
+        result = yield self.filter(title, limit=1, **kwargs)
+        raise gen.Return(result[0])
+
+    @gen.coroutine
+    def _get_track(self, id, storage_dir=None, **kwargs):
+        album = kwargs.pop('album', None)
+        album__id = kwargs.pop('album__id', None)
+        album__title = kwargs.pop('album__title', None)
+        if storage_dir:
+            raise gen.Return(Track.get(
+                id=id, storage_dir=storage_dir, album=album, **kwargs
+            ))
+        if not album:
+            albums = self.search.objects(Album)
+            if album__id:
+                album = yield albums.get(id=album__id)
+            elif album__title:
+                album = yield albums.get(title=album__title)
+            else:
+                raise ValueError('Album required!')
+        track = Track.get(id=id, album=album)
+        yield self.search.get_data(track)
+        raise gen.Return(track)
+
+
+def _blocking(name):
+    """Method of blocking cursor, which can't work with futures"""
+    def method(self, *args, **kwargs):
+        raise TypeError(
+            '%s is not supported by AsyncSearch, use Search' % name,
+        )
+    method.__name__ = name
+    return method
+
+
+class AsyncSearch(Search):
+    """Search with coroutine based api, entities are shared with
+    blocking cursor. Blocking api of Search, cursor context and managers
+    using cursor raise TypeError"""
+    __enter__ = _blocking('cursor context')
+    bind = _blocking('bind')
+    result_set = _blocking('result_set')
+    search_many = _blocking('search_many')
+
+    def __init__(self, client=None, **kwargs):
+        super(AsyncSearch, self).__init__(**kwargs)
+        self._client = client
+
+    @property
+    def client(self):
+        if not self._client:
+            self._client = AsyncHTTPClient()
+        return self._client
+
+    def objects(self, model):
+        """Get async manager for Artist, Album or Track"""
+        return AsyncManager(self, model)
+
+    @property
+    def artists(self):
+        return self.objects(Artist)
+
+    @property
+    def albums(self):
+        return self.objects(Album)
+
+    @property
+    def tracks(self):
+        return self.objects(Track)
+
+    @gen.coroutine
+    def open(self, url, headers=None):
+        """Open with cookies, rate limits and retries of scheduler,
+        returns file-like object"""
+        started = time.time()
+        try:
+            response = yield self._scheduled_open(url, headers)
+        except (IOError, httplib.HTTPException, HTTPError) as e:
+            if self.metrics is not None:
+                self.metrics.request(url, time.time() - started, e)
+            raise
+        if self.metrics is not None:
+            self.metrics.request(url, time.time() - started)
+        raise gen.Return(response)
+
+    @gen.coroutine
+    def _scheduled_open(self, url, headers=None):
+        if self.scheduler is None:
+            response = yield self._open(url, headers)
+            raise gen.Return(response)
+        failures = 0
+        while True:
+            yield gen.sleep(self.scheduler.wait(url))
+            try:
+                response = yield self._open(url, headers)
+            except (IOError, httplib.HTTPException, HTTPError) as e:
+                failures += 1
+                # tornado reports timeouts and connection errors as 599
+                delay = self.scheduler.failed(
+                    url, failures, e, network=getattr(e, 'code', None) == 599,
+                )
+                yield gen.sleep(delay)
+            else:
+                self.scheduler.succeeded(url)
+                raise gen.Return(response)
+
+    @gen.coroutine
+    def _open(self, url, headers=None):
+        request = urllib2.Request(url, headers=headers or {})
+        self.cookie_jar.add_cookie_header(request)
+        response = yield self.client.fetch(
+            url, headers=dict(request.header_items()),
+        )
+        self.cookie_jar.extract_cookies(
+            _CookieResponse(response.headers), request,
+        )
+        raise gen.Return(response.buffer)
+
+    def fetch(self, url):
+        """Read response body, concurrent reads of same url share one
+        request"""
+        return self.flights.do_async(url, self._fetch, url)
+
+    @gen.coroutine
+    def _fetch(self, url):
+        response = yield self.open(url)
+        data = response.read()
+        if self.metrics is not None:
+            self.metrics.response(url, len(data))
+        raise gen.Return(data)
+
+    @gen.coroutine
+    def _open_page(self, type, text, page):
+        data = yield self.fetch(self._page_url(type, text, page))
+        raise gen.Return(self.parse('search', self.TYPES[type], data))
+
+    @gen.coroutine
+    def search(self, type, text, single=False, limit=None):
+        """Search items, returns list or single item"""
+        if type not in self.TYPES:
+            raise AttributeError('Wrong type')
+        if single:
+            limit = 1
+        result = []
+        pages_count = 1
+        current_page = 0
+        while pages_count > current_page:
+            if self.prefetch and current_page:
+                pages = range(current_page, min(
+                    pages_count, current_page + max(self.prefetch_window, 1),
+                ))
+                parsed = yield [
+                    self._open_page(type, text, page) for page in pages
+                ]
+                current_page = pages[-1] + 1
+                pages_count = max([pages_count] + [
+                    page['pages_count'] or 0 for page in parsed
+                ])
+            else:
+                page = yield self._open_page(type, text, current_page)
+                parsed = [page]
+                pages_count, current_page = self._next_page(
+                    page, pages_count, current_page,
+                )
+            for page in parsed:
+                for obj in self._get(type, page):
+                    result.append(obj)
+                    if limit and len(result) >= limit:
+                        raise gen.Return(result[0] if single else result)
+        if single:
+            raise IndexError('Not found')
+        raise gen.Return(result)
+
+    def get_data(self, obj):
+        """Load data of Artist, Album or Track, concurrent loads of same
+        entity share one fetch"""
+        return self.flights.do_async((obj.kind(), obj.id), self._get_data, obj)
+
+    @gen.coroutine
+    def _get_data(self, obj):
+        record = obj._load_record()
+        if record is None:
+            data = yield self.fetch(obj._data_url())
+            obj._parse_data(data, self)
+        else:
+            obj._apply(record)
+        raise gen.Return(obj)
+
+    @gen.coroutine
+    def get_albums(self, artist):
+        if not hasattr(artist, '_albums'):
+            yield self.get_data(artist)
+        raise gen.Return(artist._albums)
+
+    @gen.coroutine
+    def get_tracks(self, obj):
+        """Get tracks of Album or Artist"""
+        if isinstance(obj, Artist):
+            if not hasattr(obj, '_tracks'):
+                albums = yield self.get_albums(obj)
+                tracks = yield [self.get_tracks(album) for album in albums]
+                obj._tracks = list(chain.from_iterable(tracks))
+        elif not hasattr(obj, '_tracks'):
+            yield self.get_data(obj)
+        raise gen.Return(obj._tracks)
+
+    @gen.coroutine
+    def url(self, track):
+        """Calculate track url"""
+        download_info = track._cached_download_info()
+        if download_info is not None:
+            raise gen.Return(track._build_url(download_info))
+        info_path = yield self.fetch(track._info_url())
+        file_path = yield self.fetch(track._download_info_url(info_path))
+        raise gen.Return(track._parse_url(file_path))
+
+    @gen.coroutine
+    def resolve_urls(self, tracks):
+        """Resolve download urls of tracks concurrently"""
+        urls = yield [self.url(track) for track in tracks]
+        raise gen.Return(urls)
+
+    @gen.coroutine
+    def open_track(self, track):
+        """Open track, returns file-like object"""
+        url = yield self.url(track)
+        response = yield self.open(url)
+        raise gen.Return(response)
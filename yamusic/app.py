@@ -11,40 +11,252 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from BeautifulSoup import BeautifulSoup, BeautifulStoneSoup
+from BeautifulSoup import BeautifulStoneSoup
 import urllib2
+import urllib
 import cookielib
-from itertools import imap, islice
+import httplib
+import os
+from itertools import islice, chain
+from array import array
+from collections import deque, OrderedDict
+from multiprocessing.pool import ThreadPool
+from contextlib import contextmanager
 from hashlib import md5
+import threading
+import Queue
+import copy
 import json
-import re
+import random
+import time
+from .transport import (
+    ConnectionPool, KeepAliveHandler, GzipProcessor, SingleFlight,
+)
+from .parsers import FastParser, fix_json_single_quotes
 
 TYPE_TRACKS = 0
 TYPE_ALBUMS = 1
 TYPE_ARTISTS = 2
 
+_context = threading.local()
 
-def fix_json_single_quotes(text):
-    def replace_quotes(match):
-        if match.group(1)[0] == "'":
-            return '"%s"'%(match.group(2).replace(r"\'","'").replace('"',r'\"'))
-        else:
-            return '"%s"'%(match.group(2))
 
-    return re.sub(r"""(["'])((?:\\?.)*?)\1""", replace_quotes, text);
+def get_cursor():
+    """Get cursor used in current thread, global cursor by default"""
+    stack = getattr(_context, 'stack', None)
+    if stack:
+        return stack[-1]
+    return cursor
+
+
+def compact(value):
+    """Get ascii text as interned str, it takes less memory than unicode
+    and equal values share one object"""
+    if isinstance(value, unicode):
+        try:
+            value = value.encode('ascii')
+        except UnicodeEncodeError:
+            return value
+    if isinstance(value, str):
+        return intern(value)
+    return value
+
+
+class IdentityCache(object):
+    """Identity map with size bound, lru eviction and optional ttl"""
+
+    def __init__(self, max_size=None, ttl=None):
+        """Create cache
+
+        Keyword Arguments:
+        max_size -- max items count, unbounded if None
+        ttl -- seconds before item expires, never if None
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self.on_lookup = None
+
+    def _key(self, id):
+        """Ids from urls are strings, from json - ints"""
+        try:
+            return int(id)
+        except (TypeError, ValueError):
+            return id
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, id, default=None):
+        found, obj = self._lookup(self._key(id))
+        if self.on_lookup is not None:
+            self.on_lookup(found)
+        return obj if found else default
+
+    def _lookup(self, key):
+        with self._lock:
+            try:
+                obj, created = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return False, None
+            if self._expired(created):
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._items[key] = obj, created
+            self.hits += 1
+            return True, obj
+
+    def set(self, id, obj):
+        key = self._key(id)
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = obj, time.time()
+            while self.max_size is not None and len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def peek(self, id):
+        """Get cached object without counting lookup and updating order"""
+        with self._lock:
+            item = self._items.get(self._key(id))
+            if item is not None and not self._expired(item[1]):
+                return item[0]
+
+    def add(self, id, obj):
+        """Cache obj if id not cached yet, returns cached object"""
+        with self._lock:
+            item = self._items.get(self._key(id))
+            if item is not None and not self._expired(item[1]):
+                return item[0]
+            self.set(id, obj)
+            return obj
+
+    def invalidate(self, id):
+        with self._lock:
+            self._items.pop(self._key(id), None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def values(self):
+        """Get not expired objects"""
+        with self._lock:
+            return [
+                obj for obj, created in self._items.values()
+                if not self._expired(created)
+            ]
+
+    @property
+    def stats(self):
+        return {
+            'size': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def __contains__(self, id):
+        with self._lock:
+            item = self._items.get(self._key(id))
+            return item is not None and not self._expired(item[1])
+
+    def __getitem__(self, id):
+        obj = self.get(id, KeyError)
+        if obj is KeyError:
+            raise KeyError(id)
+        return obj
+
+    def __setitem__(self, id, obj):
+        self.set(id, obj)
+
+    def __delitem__(self, id):
+        self.invalidate(id)
+
+    def __len__(self):
+        return len(self._items)
+
 
 class Cached(object):
     """Simple cache for avoiding duplicates"""
+    __slots__ = ()
     CACHE = ''
 
+    @classmethod
+    def cache(cls):
+        """Get identity cache of entity type"""
+        return getattr(Search, cls.CACHE)
+
+    @classmethod
+    def kind(cls):
+        return cls.__name__.lower()
+
+    def get_data(self):
+        """Load data from storage or from fragment, concurrent calls for
+        same entity share one load and object is filled only once"""
+        get_cursor().flights.do((self.kind(), self.id), self._load_data)
+
+    def _load_data(self):
+        record = self._load_record()
+        if record is None:
+            record = self._extract(get_cursor().fetch(self._data_url()))
+            self._save_record(record)
+        self._apply(record)
+
+    def _parse_data(self, data, cursor=None):
+        record = self._extract(data, cursor)
+        self._save_record(record)
+        self._apply(record)
+
+    def _load_record(self):
+        if Search.STORAGE is not None:
+            return Search.STORAGE.load(self.kind(), self.id)
+
+    def _save_record(self, record):
+        if Search.STORAGE is not None:
+            Search.STORAGE.save(self.kind(), self.id, record)
+
+    def _extract(self, data, cursor=None):
+        """Parse fragment to plain record with cursor or current one"""
+        raise NotImplementedError
+
+    def _apply(self, record):
+        """Fill object from record"""
+        raise NotImplementedError
+
+    def _loaded(self):
+        """Is object filled from fragment"""
+        raise NotImplementedError
+
+    def _related(self, field):
+        """Get related objects for hydration"""
+        raise AttributeError('Wrong field')
+
+    def _terms(self):
+        """Get titles of object and its relations for local index"""
+        return [self.title]
+
+    def _index(self):
+        if Search.INDEX is not None:
+            Search.INDEX.add(self)
+
     @classmethod
     def get(cls, **kwargs):
-        id = kwargs.get('id', -1)
-        if id in getattr(Search, cls.CACHE):
-            return getattr(Search, cls.CACHE)[id]
+        id = kwargs.get('id')
+        cache = cls.cache()
+        if id is not None:
+            result = cache.get(id)
+            if result is not None:
+                return result
         result = cls(**kwargs)
         if result.id:
-            getattr(Search, cls.CACHE)[id] = result
+            result = cache.add(id, result)
+            result._index()
         return result
 
     def __unicode__(self):
@@ -57,12 +269,124 @@ class Cached(object):
         )
 
 
+class ResultSet(object):
+    """Lazy search result, fetches and caches only pages needed for
+    iteration, indexing, slicing and counting. All pages except the
+    last one are expected to have the size of the first page."""
+
+    def __init__(self, search, type, text):
+        self.search = search
+        self.type = type
+        self.text = text
+        self._pages = {}
+        self._pending = {}
+        self._pages_count = 0
+
+    def _schedule(self, numbers):
+        """Start fetching pages in worker pool when prefetch enabled"""
+        if not self.search.prefetch:
+            return
+        for number in numbers:
+            if number not in self._pages and number not in self._pending:
+                self._pending[number] = self.search.pool.apply_async(
+                    self.search._open_page, (self.type, self.text, number),
+                )
+
+    def _page(self, number):
+        """Get objects of page, fetches page when not cached"""
+        if number not in self._pages:
+            if number in self._pending:
+                page = self._pending.pop(number).get()
+            else:
+                page = self.search._open_page(self.type, self.text, number)
+            self._pages_count = max(
+                self._pages_count, page['pages_count'] or 0, number + 1,
+            )
+            self._pages[number] = list(self.search._get(self.type, page))
+        return self._pages[number]
+
+    @property
+    def page_size(self):
+        return len(self._page(0))
+
+    @property
+    def pages_count(self):
+        self._page(0)
+        return self._pages_count
+
+    def _item(self, index):
+        if not self.page_size or index // self.page_size >= self.pages_count:
+            raise IndexError(index)
+        page = self._page(index // self.page_size)
+        return page[index % self.page_size]
+
+    def count(self):
+        """Count results by pager, fetches only first and last pages"""
+        while True:
+            last = self.pages_count - 1
+            objects = self._page(last)
+            if last == self.pages_count - 1:
+                return last * self.page_size + len(objects)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        number = 0
+        while number < self.pages_count:
+            self._schedule(range(
+                number + 1,
+                min(number + 1 + self.search.prefetch_window,
+                    self._pages_count),
+            ))
+            for obj in self._page(number):
+                yield obj
+            number += 1
+
+    def __getitem__(self, item):
+        if type(item) is slice:
+            start, stop, step = item.start, item.stop, item.step
+            if (
+                (start or 0) < 0 or stop is None or stop < 0 or
+                (step or 1) < 0
+            ):
+                start, stop, step = item.indices(self.count())
+            indexes = xrange(start or 0, stop, step or 1)
+            if indexes and self.page_size:
+                self._schedule(range(
+                    min(indexes[0], indexes[-1]) // self.page_size,
+                    min(max(indexes[0], indexes[-1]) // self.page_size + 1,
+                        self.pages_count),
+                ))
+            result = []
+            for index in indexes:
+                try:
+                    result.append(self._item(index))
+                except IndexError:
+                    break
+            return result
+        elif item < 0:
+            return self._item(self.count() + item)
+        else:
+            return self._item(item)
+
+
 class Manager(object):
 
-    def __init__(self, search_cls, _type, filter_fnc=None):
+    def __init__(self, search_cls, _type, filter_fnc=None, cursor=None):
         self.search_cls = search_cls
         self.type = _type
         self._filter_fnc = filter_fnc
+        self._cursor = cursor
+
+    def _get_cursor(self):
+        return self._cursor or get_cursor()
+
+    def using(self, cursor):
+        """Get manager working with cursor"""
+        manager = copy.copy(self)
+        manager._cursor = cursor
+        return manager
 
     @property
     def filter_result(self):
@@ -100,20 +424,35 @@ class Manager(object):
             titles.append(title)
         return ' '.join(titles)
 
-    def _search(self, single, title='', **kwargs):
+    def _get_text(self, title='', **kwargs):
         titles = self._get_titles(*self.search_cls, **kwargs)
         if title:
             titles = ' '.join([titles, title])
-        return cursor.search(self.type, titles, single=single)
+        return titles
+
+    def _search(self, single, title='', local=False, **kwargs):
+        with self._get_cursor() as search:
+            titles = self._get_text(title, **kwargs)
+            if local and Search.INDEX is not None:
+                found = Search.INDEX.search(self.type, titles)
+                if found:
+                    return found[0] if single else found
+            if single:
+                return search.search(self.type, titles, single=single)
+            return search.result_set(self.type, titles)
 
     def all(self):
         return list(self.filter_result)
 
+    def count(self):
+        return len(self.filter_result)
+
     def filter(self, title='', **kwargs):
         return Manager(
             self.search_cls,
             self.type,
-            lambda: self._search(False, title, **kwargs)
+            lambda: self._search(False, title, **kwargs),
+            self._cursor,
         )
 
     def get(self, title='', **kwargs):
@@ -121,19 +460,36 @@ class Manager(object):
             raise ValueError
         return self._search(True, title, **kwargs)
 
+    def get_many(self, queries):
+        """Get first found object for each of dicts with fields of get,
+        queries are searched concurrently
+
+        Returns: iterator of (number of query, object or None) in order
+        of completion
+        """
+        numbers = OrderedDict()
+        with self._get_cursor() as search:
+            for number, query in enumerate(queries):
+                numbers.setdefault(
+                    (self.type, self._get_text(**query)), [],
+                ).append(number)
+        for query, objects in search.search_many(numbers, limit=1):
+            for number in numbers[query]:
+                yield number, objects[0] if objects else None
+
     def __getitem__(self, item):
-        if type(item) is slice:
-            return list(islice(
-                self.filter_result, item.start, item.stop, item.step
-            ))
-        else:
-            return list(islice(self.filter_result, item, item + 1))[0]
+        return self.filter_result[item]
 
     def __iter__(self):
-        return self.filter_result
+        return iter(self.filter_result)
 
     def __len__(self):
-        return len(self.all())
+        return len(self.filter_result)
+
+    def prefetch(self, *fields):
+        """Get all objects with related fields loaded in bulk"""
+        with self._get_cursor():
+            return hydrate(self.filter_result, *fields)
 
 
 class ArtistManager(Manager):
@@ -143,21 +499,22 @@ class ArtistManager(Manager):
 
     def get(self, id=None, **kwargs):
         if id:
-            artist = Artist(id=id)
-            artist.get_data()
-            return artist
+            with self._get_cursor():
+                return hydrate([Artist.get(id=id)])[0]
         else:
             return super(ArtistManager, self).get(**kwargs)
 
 
 class Artist(Cached):
     """Artist item"""
+    __slots__ = ('id', 'title', '_albums', '_tracks')
+    TYPE = TYPE_ARTISTS
     CACHE = 'ARTISTS_CACHE'
     objects = ArtistManager()
 
     def __init__(self, id=None, title=None):
         self.id = id
-        self.title = title
+        self.title = compact(title)
 
     def __unicode__(self):
         return self.title
@@ -168,44 +525,58 @@ class Artist(Cached):
             self.get_data()
         return self._albums
 
-    def get_data(self):
-        self._albums = []
-        data = cursor.open(
-            'http://music.yandex.ru/fragment/artist/%d/tracks' %
-            int(self.id)
-        ).read()
-        soup = BeautifulSoup(data)
-        self.title = cursor._remove_html(
-            soup.find(
-                'h1', cursor._class_filter('b-title__title')
-            ).__unicode__()
+    def _data_url(self):
+        return 'http://music.yandex.ru/fragment/artist/%d/tracks' % int(
+            self.id
         )
-        for album in soup.findAll(
-            'div', cursor._class_filter('b-album-control')
-        ):
-            try:
-                album_data = json.loads(fix_json_single_quotes(album['onclick'][7:]))
-                album = Album.get(
-                    id=album_data.get('id'),
-                    title=album_data.get('title'),
-                    artist=self,
-                    cover=album_data.get('cover')
-                )
-                self._albums.append(album)
+
+    def _extract(self, data, cursor=None):
+        return (cursor or get_cursor()).parse('artist', data)
+
+    def _apply(self, record, changed=None):
+        """Fill artist, when changed is set tracks are set only to
+        albums with id in it and to not loaded ones"""
+        self.title = compact(record['title'])
+        albums = []
+        for album_data in record['albums']:
+            album = Album.get(
+                id=album_data.get('id'),
+                title=album_data.get('title'),
+                artist=self,
+                cover=album_data.get('cover')
+            )
+            albums.append(album)
+            if changed is None or not album._loaded() or (
+                Album.cache()._key(album.id) in changed
+            ):
                 album.set_tracks(album_data.get('tracks'))
-            except ValueError:
-                pass
+        self._albums = albums
+        try:
+            del self._tracks
+        except AttributeError:
+            pass
+        self._index()
 
     def get_tracks(self):
         """Lazy get artist tracks"""
         if hasattr(self, '_tracks'):
             return self._tracks
         tracks = []
-        for album in self.get_albums():
+        for album in hydrate(self.get_albums()):
             tracks += album.get_tracks()
         self._tracks = tracks
         return self._tracks
 
+    def _loaded(self):
+        return hasattr(self, '_albums')
+
+    def _related(self, field):
+        if field == 'albums':
+            return self.get_albums()
+        elif field == 'tracks':
+            return self.get_tracks()
+        return super(Artist, self)._related(field)
+
 
 class AlbumManager(Manager):
 
@@ -214,15 +585,16 @@ class AlbumManager(Manager):
 
     def get(self, id=None, **kwargs):
         if id:
-            album = Album(id=id)
-            album.get_data()
-            return album
+            with self._get_cursor():
+                return hydrate([Album.get(id=id)])[0]
         else:
             return super(AlbumManager, self).get(**kwargs)
 
 
 class Album(Cached):
     """Album item"""
+    __slots__ = ('id', 'title', 'cover', 'artist', '_tracks')
+    TYPE = TYPE_ALBUMS
     CACHE = 'ALBUMS_CACHE'
     objects = AlbumManager()
 
@@ -230,8 +602,8 @@ class Album(Cached):
                  artist__id=None, artist__title=None,
                  artist=None):
         self.id = id
-        self.title = title
-        self.cover = cover
+        self.title = compact(title)
+        self.cover = compact(cover)
         if artist__id or artist__title:
             self.artist = Artist.get(
                 id=artist__id,
@@ -241,19 +613,29 @@ class Album(Cached):
             self.artist = artist
 
     def set_tracks(self, tracks):
-        """Set tracks to album"""
-        self._tracks = []
-        for track in tracks:
-            self._tracks.append(
-                Track.get(
-                    id=track['id'],
-                    title=track['title'],
-                    artist=self.artist,
-                    album=self,
-                    duration=track['duration'],
-                    storage_dir=track['storage_dir'],
-                )
-            )
+        """Set tracks to album, already known tracks are filled"""
+        if Search.COLUMNAR_TRACKS:
+            self._tracks = TrackList(self, tracks)
+            cache = Track.cache()
+            for index, id in enumerate(self._tracks.ids):
+                if cache.peek(id) is not None:
+                    self._tracks[index]
+            return
+        self._tracks = [
+            self._fill(
+                Track.get(id=track['id']), track['title'],
+                track['duration'], track['storage_dir'],
+            ) for track in tracks
+        ]
+
+    def _fill(self, track, title, duration, storage_dir):
+        track.title = compact(title)
+        track.artist = self.artist
+        track.album = self
+        track.duration = duration
+        track.storage_dir = compact(storage_dir)
+        track._index()
+        return track
 
     def get_tracks(self):
         """Lazy get album tracks"""
@@ -261,41 +643,75 @@ class Album(Cached):
             self.get_data()
         return self._tracks
 
-    def get_data(self):
-        data = cursor.open(
-            'http://music.yandex.ru/fragment/album/%d' %
-            int(self.id)
-        ).read()
-        soup = BeautifulSoup(data)
-        self._tracks = []
-        artist_soup = soup.find(
-            'div', cursor._class_filter('b-title__artist')
-        ).find('a')
-        self.artist__id = artist_soup['href'].split('/')[-1]
-        self.artist__title = cursor._remove_html(artist_soup.__unicode__())
+    def get_cover(self):
+        """Get path of cover image in Search.COVERS, it is downloaded
+        only when not cached"""
+        if Search.COVERS is None:
+            raise ValueError('Search.COVERS is not set')
+        if not self.cover:
+            return None
+        path = Search.COVERS.get(self.cover)
+        if path is None:
+            path = Search.COVERS.put(
+                self.cover, get_cursor().fetch(self.cover),
+            )
+        return path
+
+    @classmethod
+    def iter_covers(cls, albums):
+        """Download covers concurrently, yields (album, path) as soon as
+        cover is ready, path is None if album has no cover or it failed
+        or has wrong url"""
+        search = get_cursor()
+
+        def cover(album):
+            try:
+                return album, album.get_cover()
+            except (IOError, httplib.HTTPException, ValueError):
+                return album, None
+        return search.pool.imap_unordered(search.bind(cover), albums)
+
+    @classmethod
+    def fetch_covers(cls, albums):
+        """Download covers concurrently
+
+        Returns: dict of path by album
+        """
+        return dict(cls.iter_covers(albums))
+
+    def _data_url(self):
+        return 'http://music.yandex.ru/fragment/album/%d' % int(self.id)
+
+    def _extract(self, data, cursor=None):
+        return (cursor or get_cursor()).parse('album', data)
+
+    def _apply(self, record):
         self.artist = Artist.get(
-            id=self.artist__id,
-            title=self.artist__title,
-        )
-        for track in soup.findAll('div', cursor._class_filter('b-track')):
-            track_data = json.loads(track['onclick'][7:])
-            self._tracks.append(Track.get(
-                id=track_data['id'],
-                title=track_data['title'],
-                artist=self.artist,
-                album=self,
-                storage_dir=track_data['storage_dir'],
-                duration=track_data['duration']
-            ))
-        self.title = cursor._remove_html(
-            soup.find(
-                'h1', cursor._class_filter('b-title__title')
-            ).__unicode__()
+            id=record['artist']['id'],
+            title=record['artist']['title'],
         )
+        self.title = compact(record['title'])
+        self.set_tracks(record['tracks'])
+        self._index()
 
     def __unicode__(self):
         return u'%s - %s' % (self.artist, self.title)
 
+    def _terms(self):
+        if hasattr(self, 'artist'):
+            return [self.title, self.artist.title]
+        return [self.title]
+
+    def _loaded(self):
+        return hasattr(self, '_tracks')
+
+    def _related(self, field):
+        if field == 'artist':
+            return [self.artist] if hasattr(self, 'artist') else []
+        elif field == 'tracks':
+            return self.get_tracks()
+        return super(Album, self)._related(field)
+
 
 class TrackManager(Manager):
 
@@ -303,27 +719,29 @@ class TrackManager(Manager):
         super(TrackManager, self).__init__((Artist, Album), TYPE_TRACKS)
 
     def get(self, id=None, storage_dir=None, **kwargs):
-        album = kwargs.get('album', None)
-        album__id = kwargs.get('album__id', None)
-        album__title = kwargs.get('album__title', None)
-        if not album:
-            if album__id:
-                album = Album.objects.get(id=album__id)
-            elif album__title:
-                album = Album.objects.get(title=album__title)
-        if id and storage_dir:
-            return Track(id, storage_dir, **kwargs)
-        elif id and album:
-            track = Track(id=id, album=album)
-            track.get_data()
-            return track
-        else:
-            return super(TrackManager, self).get(**kwargs)
+        with self._get_cursor():
+            album = kwargs.get('album', None)
+            album__id = kwargs.get('album__id', None)
+            album__title = kwargs.get('album__title', None)
+            if not album:
+                if album__id:
+                    album = Album.objects.get(id=album__id)
+                elif album__title:
+                    album = Album.objects.get(title=album__title)
+            if id and storage_dir:
+                return Track.get(id=id, storage_dir=storage_dir, **kwargs)
+            elif id and album:
+                return hydrate([Track.get(id=id, album=album)])[0]
+            else:
+                return super(TrackManager, self).get(**kwargs)
 
 
 class Track(Cached):
     """Track item"""
+    __slots__ = ('id', 'title', 'artist', 'album', 'duration', 'storage_dir')
+    TYPE = TYPE_TRACKS
     CACHE = "TRACKS_CACHE"
+    CHUNK_SIZE = 64 * 1024
     objects = TrackManager()
 
     def __init__(self, id=None, title=None, artist__id=None,
@@ -331,7 +749,7 @@ class Track(Cached):
                  album__cover=None, duration=None, storage_dir=None,
                  artist=None, album=None):
         self.id = int(id)
-        self.title = title
+        self.title = compact(title)
         if artist__id or artist__title:
             self.artist = Artist.get(
                 id=artist__id,
@@ -344,7 +762,7 @@ class Track(Cached):
                 cover=album__cover,
             )
         self.duration = duration
-        self.storage_dir = storage_dir
+        self.storage_dir = compact(storage_dir)
         if artist:
             self.artist = artist
         if album:
@@ -353,48 +771,356 @@ class Track(Cached):
     def __unicode__(self):
         return u'%s - %s' % (self.artist, self.title)
 
+    def _terms(self):
+        return [self.title] + [
+            getattr(self, field).title for field in ('artist', 'album')
+            if hasattr(self, field)
+        ]
+
     @property
     def url(self):
-        """Calculate track url"""
+        """Calculate track url, download info is reused until expired"""
+        download_info = self._cached_download_info()
+        if download_info is None:
+            info_path_data = get_cursor().fetch(self._info_url())
+            file_path_data = get_cursor().fetch(
+                self._download_info_url(info_path_data)
+            )
+            download_info = self._cache_download_info(file_path_data)
+        return self._build_url(download_info)
+
+    def _cached_download_info(self):
+        """Get download info if it not expires soon"""
+        download_info = Search.URLS_CACHE.get(self.storage_dir)
+        if download_info and (
+            download_info['expires'] - Search.URL_REFRESH > time.time()
+        ):
+            return download_info
+
+    def _cache_download_info(self, file_path_data):
+        download_info = self._parse_download_info(file_path_data)
+        Search.URLS_CACHE.set(self.storage_dir, download_info)
+        return download_info
+
+    def _info_url(self):
         if not self.storage_dir:
             raise AttributeError('Storage dir required!')
-        info_path_data = cursor.open(
-            'http://storage.music.yandex.ru/get/%s/2.xml' % self.storage_dir
-        ).read()
+        return 'http://storage.music.yandex.ru/get/%s/2.xml' % self.storage_dir
+
+    def _download_info_url(self, info_path_data):
         info_path_soup = BeautifulStoneSoup(info_path_data)
-        file_path_data = cursor.open(
-            'http://storage.music.yandex.ru/download-info/%s/%s' % (
-                self.storage_dir,
-                info_path_soup.find('track')['filename'],
-            )
-        ).read()
+        return 'http://storage.music.yandex.ru/download-info/%s/%s' % (
+            self.storage_dir,
+            info_path_soup.find('track')['filename'],
+        )
+
+    def _parse_download_info(self, file_path_data):
         file_path_soup = BeautifulStoneSoup(file_path_data).find('download-info')
-        path = file_path_soup.find('path').text
+        download_info = dict(
+            (name, file_path_soup.find(name).text)
+            for name in ('host', 'path', 's', 'ts')
+        )
+        try:  # ts is hex timestamp of signing
+            signed = int(download_info['ts'], 16)
+        except ValueError:
+            signed = None
+        if not signed or abs(signed - time.time()) > Search.URL_TTL:
+            signed = time.time()
+        download_info['expires'] = signed + Search.URL_TTL
+        return download_info
+
+    def _build_url(self, download_info):
+        path = download_info['path']
         return 'http://%s/get-mp3/%s/%s%s?track-id=%d&region=225&from=service-search' % (
-            file_path_soup.find('host').text,
-            cursor.get_key(path[1:] + file_path_soup.find('s').text),
-            file_path_soup.find('ts').text,
+            download_info['host'],
+            get_cursor().get_key(path[1:] + download_info['s']),
+            download_info['ts'],
             path,
             int(self.id),
         )
 
-    def get_data(self):
-        self.artist = self.album.artist
-        soup = BeautifulSoup(
-            cursor.open(
-                'http://music.yandex.ru/fragment/track/%d/album/%d' % (
-                    self.id,
-                    self.album.id,
+    def _parse_url(self, file_path_data):
+        return self._build_url(self._cache_download_info(file_path_data))
+
+    def _data_url(self):
+        return 'http://music.yandex.ru/fragment/track/%d/album/%d' % (
+            self.id,
+            int(self.album.id),
+        )
+
+    def _extract(self, data, cursor=None):
+        return (cursor or get_cursor()).parse('track', data)
+
+    def _apply(self, record):
+        self.title = compact(record['title'])
+        self.artist = Artist.get(
+            id=record['artist__id'], title=record['artist__title'],
+        )
+        self.album = Album.get(
+            id=record['album__id'], title=record['album__title'],
+            cover=record['album__cover'], artist=self.artist,
+        )
+        self.storage_dir = compact(record['storage_dir'])
+        self._index()
+
+    def _loaded(self):
+        return self.storage_dir is not None
+
+    def _related(self, field):
+        if field in ('album', 'artist'):
+            return [getattr(self, field)] if hasattr(self, field) else []
+        return super(Track, self)._related(field)
+
+    def open(self, headers=None):
+        """Open track like urlopen, without compression"""
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'identity')
+        return get_cursor().open(self.url, headers)
+
+    def iter_content(self, chunk_size=None):
+        """Iterate over track data by chunks"""
+        response = self.open()
+        try:
+            for chunk in iter(
+                lambda: response.read(chunk_size or self.CHUNK_SIZE), '',
+            ):
+                yield chunk
+        finally:
+            response.close()
+
+    def _get_size(self):
+        response = self.open({'Range': 'bytes=0-0'})
+        response.close()
+        content_range = response.info().getheader('Content-Range')
+        if response.getcode() == 206 and content_range:
+            return int(content_range.split('/')[-1])
+        return int(response.info().getheader('Content-Length'))
+
+    def _download_range(self, path, start, end, chunk_size, retries,
+                        on_chunk=None):
+        """Download bytes from start to end (or to end of track if None)
+        into file, failed request is continued from last written byte,
+        request without progress is counted as failed"""
+        position = start
+        failures = 0
+        with open(path, 'r+b') as output:
+            while end is None or position < end:
+                passed = position
+                try:
+                    response = self.open({'Range': 'bytes=%d-%s' % (
+                        position, '' if end is None else end - 1,
+                    )})
+                    # server can ignore range and send whole track
+                    offset = position if response.getcode() == 206 else 0
+                    length = response.info().getheader('Content-Length')
+                    expected = None if length is None else offset + int(length)
+                    output.seek(position)
+                    while end is None or position < end:
+                        chunk = response.read(chunk_size)
+                        if not chunk:
+                            break
+                        if offset + len(chunk) > position:
+                            data = chunk[max(position - offset, 0):]
+                            if end is not None:
+                                data = data[:end - position]
+                            output.write(data)
+                            position += len(data)
+                            if on_chunk:
+                                on_chunk(len(data))
+                        offset += len(chunk)
+                    response.close()
+                    if expected is not None and offset < expected and (
+                        end is None or position < end
+                    ):
+                        raise IOError('Connection closed at %d' % offset)
+                    if end is None:
+                        break
+                    if position == passed:
+                        raise IOError('No data at %d' % position)
+                except (IOError, httplib.HTTPException) as e:
+                    if getattr(e, 'code', None) == 416 and end is None:
+                        break  # already downloaded
+                    failures += 1
+                    if failures > retries:
+                        raise
+                    time.sleep(
+                        min(2 ** failures * 0.1, 5) * random.uniform(0.5, 1.5),
+                    )
+        return position
+
+    def _load_ranges(self, part_path, ranges_path):
+        """Get [position, end] of not finished segments or None"""
+        if not os.path.exists(part_path):
+            return None
+        try:
+            with open(ranges_path) as ranges_file:
+                return json.load(ranges_file)
+        except (IOError, ValueError):
+            return None
+
+    def _save_ranges(self, ranges_path, ranges):
+        with open(ranges_path, 'w') as ranges_file:
+            json.dump(ranges, ranges_file)
+
+    def download_to(self, path, chunk_size=None, retries=3, segments=1,
+                    on_chunk=None):
+        """Download track to file
+
+        Keyword Arguments:
+        path -- file path, data is written to path.part before finished,
+                existing part is continued, progress of segments is kept
+                in path.part.ranges and is continued by any segments
+        chunk_size -- size of read and written chunks
+        retries -- max retries of failed range
+        segments -- count of ranges downloaded in parallel
+        on_chunk -- callable receiving size of each written chunk
+        """
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        part_path = path + '.part'
+        ranges_path = part_path + '.ranges'
+        ranges = None
+        if os.path.exists(ranges_path):
+            ranges = self._load_ranges(part_path, ranges_path)
+            if ranges is None:
+                # preallocated part can't be continued without ranges
+                for stale_path in (part_path, ranges_path):
+                    if os.path.exists(stale_path):
+                        os.remove(stale_path)
+        if segments > 1 or ranges is not None:
+            if ranges is None:
+                size = self._get_size()
+                with open(part_path, 'wb') as output:
+                    output.truncate(size)  # preallocate
+                step = size // segments + 1
+                ranges = [
+                    [start, min(start + step, size)]
+                    for start in range(0, size, step)
+                ]
+            self._save_ranges(ranges_path, ranges)
+
+            def download_segment(item):
+                def written(size):
+                    item[0] += size
+                    if on_chunk:
+                        on_chunk(size)
+                self._download_range(
+                    part_path, item[0], item[1], chunk_size, retries, written,
                 )
-            ).read()
+            pool = ThreadPool(max(len(ranges), 1))
+            try:
+                pool.map(get_cursor().bind(download_segment), ranges)
+            finally:
+                pool.close()
+                pool.join()
+                self._save_ranges(ranges_path, ranges)
+            os.remove(ranges_path)
+        else:
+            if not os.path.exists(part_path):
+                open(part_path, 'wb').close()
+            self._download_range(
+                part_path, os.path.getsize(part_path), None,
+                chunk_size, retries, on_chunk,
+            )
+        os.rename(part_path, path)
+        return path
+
+
+class TrackList(object):
+    """Album tracks stored by columns, Track objects are taken from
+    identity cache or created again when accessed"""
+    __slots__ = ('album', 'ids', 'durations', 'titles', 'storage_dirs')
+
+    def __init__(self, album, records=()):
+        self.album = album
+        self.ids = array('l')
+        self.durations = array('l')
+        self.titles = []
+        self.storage_dirs = []
+        for record in records:
+            self.append(record)
+
+    def append(self, record):
+        duration = record.get('duration')
+        self.ids.append(int(record['id']))
+        self.durations.append(-1 if duration is None else duration)
+        self.titles.append(compact(record['title']))
+        self.storage_dirs.append(compact(record['storage_dir']))
+
+    def _track(self, index):
+        duration = self.durations[index]
+        return self.album._fill(
+            Track.get(id=self.ids[index]), self.titles[index],
+            None if duration == -1 else duration, self.storage_dirs[index],
         )
-        data = soup.find('div', cursor._class_filter('b-track b-track_type_track js-track'))
-        for attr, val in cursor._parse_track(data).items():
-            setattr(self, attr, val)
 
-    def open(self):
-        """Open track like urlopen"""
-        return cursor.open(self.url)
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [
+                self._track(index)
+                for index in xrange(*item.indices(len(self)))
+            ]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(item)
+        return self._track(item)
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self._track(index)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _unique(objects):
+    seen = set()
+    result = []
+    for obj in objects:
+        if id(obj) not in seen:
+            seen.add(id(obj))
+            result.append(obj)
+    return result
+
+
+def _fetch(objects):
+    """Load objects concurrently"""
+    if len(objects) > 1:
+        search = get_cursor()
+        search.pool.map(search.bind(lambda obj: obj.get_data()), objects)
+    else:
+        for obj in objects:
+            obj.get_data()
+
+
+def _load(objects):
+    """Load not loaded objects, tracks are filled by album fragments"""
+    pending = [obj for obj in _unique(objects) if not obj._loaded()]
+    tracks = [
+        obj for obj in pending
+        if isinstance(obj, Track) and hasattr(obj, 'album')
+    ]
+    _fetch(_unique(
+        [obj for obj in pending if not isinstance(obj, Track)] + [
+            track.album for track in tracks if not track.album._loaded()
+        ]
+    ))
+    _fetch([track for track in tracks if not track._loaded()])
+
+
+def hydrate(objects, *fields):
+    """Load objects and their related fields with deduplicated
+    concurrent requests, like hydrate(artists, 'albums', 'tracks')
+
+    Returns: list
+    """
+    objects = list(objects)
+    _load(objects)
+    for field in fields:
+        _load(list(chain.from_iterable(
+            obj._related(field) for obj in objects
+        )))
+    return objects
 
 
 class Search(object):
@@ -408,119 +1134,247 @@ class Search(object):
         TYPE_ARTISTS: 'artists',
     }
     URL = 'http://music.yandex.ru/fragment/search?text=%(text)s&type=%(type)s&page=%(page)d'
-    TRACKS_CACHE = {}
-    ALBUMS_CACHE = {}
-    ARTISTS_CACHE = {}
+    TRACKS_CACHE = IdentityCache(max_size=100000)
+    ALBUMS_CACHE = IdentityCache(max_size=20000)
+    ARTISTS_CACHE = IdentityCache(max_size=20000)
+    STORAGE = None
+    URLS_CACHE = IdentityCache(max_size=10000)
+    URL_TTL = 3600  # seconds before signed url expires
+    URL_REFRESH = 300  # seconds before expiration when url is refreshed
+    COLUMNAR_TRACKS = False  # keep album tracks in TrackList
+    INDEX = None  # local index of cached objects
+    COVERS = None  # disk cache of album covers
+
+    def __init__(self, prefetch=False, workers=4, prefetch_window=8,
+                 response_cache=None, keep_alive=True, max_connections=4,
+                 parser=None, scheduler=None, metrics=None, proxy=None):
+        """Create cursor
 
-    def __init__(self):
-        self._opener = self._cookie_jar = None
+        Keyword Arguments:
+        prefetch -- fetch search pages concurrently
+        workers -- size of worker pool
+        prefetch_window -- max pages fetched ahead of consumer
+        response_cache -- yamusic.http_cache.ResponseCache or None
+        keep_alive -- reuse connections and ask for compressed responses
+        max_connections -- max simultaneous connections per host
+        parser -- fragments parser, yamusic.parsers.FastParser if None
+        scheduler -- yamusic.transport.RequestScheduler or None
+        metrics -- yamusic.metrics.Metrics or None
+        proxy -- http proxy url, from environment if None
+        """
+        self._opener = self._cookie_jar = self._pool = None
+        self._connections = None
+        self._lock = threading.RLock()
         self.authenticated = False
+        self.prefetch = prefetch
+        self.workers = workers
+        self.prefetch_window = prefetch_window
+        self.response_cache = response_cache
+        self.keep_alive = keep_alive
+        self.max_connections = max_connections
+        self.parser = parser or FastParser()
+        self.flights = SingleFlight()
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.proxy = proxy
 
     @property
     def cookie_jar(self):
-        if not self._cookie_jar:
-            self._cookie_jar = cookielib.CookieJar()
+        with self._lock:
+            if not self._cookie_jar:
+                self._cookie_jar = cookielib.CookieJar()
         return self._cookie_jar
 
     @property
     def opener(self):
-        if not self._opener:
-            self._opener = urllib2.build_opener(
-                urllib2.HTTPCookieProcessor(self.cookie_jar)
-            )
+        with self._lock:
+            if not self._opener:
+                handlers = [urllib2.HTTPCookieProcessor(self.cookie_jar)]
+                if self.proxy:
+                    handlers.append(urllib2.ProxyHandler({
+                        'http': self.proxy, 'https': self.proxy,
+                    }))
+                if self.keep_alive:
+                    self._connections = ConnectionPool(self.max_connections)
+                    handlers += [
+                        KeepAliveHandler(self._connections),
+                        GzipProcessor(),
+                    ]
+                self._opener = urllib2.build_opener(*handlers)
         return self._opener
 
-    def open(self, url):
-        """Open with cookies"""
+    @property
+    def pool(self):
+        with self._lock:
+            if not self._pool:
+                self._pool = ThreadPool(self.workers)
+        return self._pool
+
+    def close(self):
+        """Stop worker threads and close idle connections, cursor can be
+        used again after it"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            connections = self._connections
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if connections is not None:
+            connections.clear()
+
+    def open(self, url, headers=None):
+        """Open with cookies, rate limits and retries of scheduler,
+        responses from cache are returned without them"""
+        if not headers and self.response_cache is not None:
+            return self.response_cache.open(_NetworkOpener(self), url)
+        return self._request(url, headers)
+
+    def _request(self, url, headers=None):
+        """Open by network with scheduler and metrics"""
+        started = time.time()
+        try:
+            if self.scheduler is not None:
+                response = self.scheduler.call(url, self._open, url, headers)
+            else:
+                response = self._open(url, headers)
+        except (IOError, httplib.HTTPException) as e:
+            if self.metrics is not None:
+                self.metrics.request(url, time.time() - started, e)
+            raise
+        if self.metrics is not None:
+            self.metrics.request(url, time.time() - started)
+        return response
+
+    def _open(self, url, headers=None):
+        if headers:
+            return self.opener.open(urllib2.Request(url, headers=headers))
         return self.opener.open(url)
 
+    def __enter__(self):
+        """Use cursor for entities and managers in current thread"""
+        if not hasattr(_context, 'stack'):
+            _context.stack = []
+        _context.stack.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _context.stack.pop()
+
+    def bind(self, function):
+        """Wrap function for running with this cursor in other thread"""
+        def bound(*args, **kwargs):
+            with self:
+                return function(*args, **kwargs)
+        return bound
+
+    def fetch(self, url):
+        """Read response body, concurrent reads of same url share one
+        request"""
+        return self.flights.do(url, self._fetch, url)
+
+    def _fetch(self, url):
+        data = self.open(url).read()
+        if self.metrics is not None:
+            self.metrics.response(url, len(data))
+        return data
+
+    def parse(self, method, *args):
+        """Parse fragment with method of parser"""
+        if self.metrics is None:
+            return getattr(self.parser, method)(*args)
+        started = time.time()
+        try:
+            return getattr(self.parser, method)(*args)
+        finally:
+            self.metrics.parse(method, time.time() - started)
+
     def get_key(self, key):
         """Get secret key for track loading"""
         return md5('XGRlBW9FXlekgbPrRHuSiA' + key.replace('\r\n', '\n')).hexdigest()
 
-    def _class_filter(self, cls_name):
-        """Create BeautifulSoup class filter"""
-        return {'class': re.compile(r'\b%s\b' % cls_name)}
-
-    def _remove_html(self, data):
-        p = re.compile(r'<.*?>')
-        try:
-            return p.sub('', data)
-        except TypeError:
-            return data
-
-    def _parse_track(self, data):
-        track = json.loads(data['onclick'][7:])
-        return {
-            'id': track['id'],
-            'title': track['title'],
-            'artist__id': track['artist_id'],
-            'artist__title': track['artist'],
-            'album__id': track['album_id'],
-            'album__title': track['album'],
-            'album__cover': track['cover'],
-            'storage_dir': track['storage_dir']
+    def _get(self, type, page):
+        cls = {
+            self.TYPE_TRACKS: Track,
+            self.TYPE_ALBUMS: Album,
+            self.TYPE_ARTISTS: Artist,
+        }[type]
+        for record in page['items']:
+            yield cls.get(**record)
+
+    def _page_url(self, type, text, page):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        return self.URL % {
+            'text': urllib.quote_plus(text),
+            'type': self.TYPES[type],
+            'page': page,
         }
 
-    def _get_tracks(self, soup):
-        for track in soup.findAll('div', self._class_filter('b-track')):
-            yield Track.get(**self._parse_track(track))
-
-    def _get_albums(self, soup):
-        for album in soup.findAll('div', self._class_filter('b-albums')):
-            cover_a = album.find('div', self._class_filter('b-albums__cover')).find('a')
-            artist_a = album.find('a',
-                self._class_filter('b-link_class_albums-title-link')
-            )
-            yield Album.get(
-                id=cover_a['href'].split('/')[-1],
-                title=self._remove_html(album.find('a',
-                    self._class_filter('b-link_class_albums-title-link')
-                ).__unicode__()),
-                cover=cover_a.find('img')['src'],
-                artist__id=artist_a['href'].split('/')[-1],
-                artist__title=self._remove_html(artist_a.__unicode__())
-            )
-
-    def _get_artists(self, soup):
-        for artist in imap(
-            lambda obj: obj.find('a'),
-            soup.findAll('div', self._class_filter('b-artist-group'))
-        ):
-            yield Artist.get(
-                id=artist['href'].split('/')[-1],
-                title=self._remove_html(artist.__unicode__())
-            )
+    def _open_page(self, type, text, page):
+        """Open search result page and parse it"""
+        return self.parse(
+            'search', self.TYPES[type],
+            self.fetch(self._page_url(type, text, page)),
+        )
 
-    def _get(self, type, soup):
-        if type == self.TYPE_TRACKS:
-            return self._get_tracks(soup)
-        elif type == self.TYPE_ALBUMS:
-            return self._get_albums(soup)
-        elif type == self.TYPE_ARTISTS:
-            return self._get_artists(soup)
+    def _next_page(self, page, pages_count, current_page):
+        """Get pages count and next page number after parsed page"""
+        if page['pages_count'] is None:
+            return pages_count, current_page + 1  # if only one page
+        return page['pages_count'], page['current_page']
 
-    def _get_result(self, type, text):  # start from 0!
+    def _get_pages(self, type, text):  # start from 0!
         pages_count = 1
         current_page = 0
         while pages_count > current_page:
-            result = self.open(self.URL % {
-                'text': text,
-                'type': self.TYPES[type],
-                'page': current_page,
-            }).read()
-            soup = BeautifulSoup(result)
-            try:
-                try:
-                    pages_count = int(soup.findAll('a', self._class_filter('b-pager__page'))[-1].text)  # start form 1!
-                except UnicodeEncodeError:  # fix work with ... page
-                    pages_count = int(soup.findAll('a', self._class_filter('b-pager__page'))[-2].text)  # start form 1!
-                current_page = int(soup.find('b', self._class_filter('b-pager__current')).text)  # start from 1!
-            except IndexError:
-                current_page += 1  # if only one page
-            for obj in self._get(type, soup):
+            page = self._open_page(type, text, current_page)
+            pages_count, current_page = self._next_page(
+                page, pages_count, current_page,
+            )
+            yield page
+
+    def _prefetch_pages(self, type, text):
+        """Fetch pages in worker pool, keep at most prefetch_window
+        pages ahead of consumer"""
+        page = self._open_page(type, text, 0)
+        pages_count = page['pages_count'] or 1
+        yield page
+        pending = deque()
+        next_page = 1
+        while pending or next_page < pages_count:
+            while (
+                next_page < pages_count and
+                len(pending) < max(self.prefetch_window, 1)
+            ):
+                pending.append(self.pool.apply_async(
+                    self._open_page, (type, text, next_page),
+                ))
+                next_page += 1
+            page = pending.popleft().get()
+            pages_count = max(pages_count, page['pages_count'] or 0)
+            yield page
+
+    def _get_result(self, type, text):
+        if self.prefetch:
+            pages = self._prefetch_pages(type, text)
+        else:
+            pages = self._get_pages(type, text)
+        for page in pages:
+            for obj in self._get(type, page):
                 yield obj
 
+    def resolve_urls(self, tracks):
+        """Resolve download urls of tracks in worker pool"""
+        return self.pool.map(
+            self.bind(lambda track: track.url), list(tracks),
+        )
+
+    def result_set(self, type, text):
+        """Get lazy page-addressable search result"""
+        if type not in self.TYPES:
+            raise AttributeError('Wrong type')
+        return ResultSet(self, type, text)
+
     def search(self, type, text, single=False):
         if type not in self.TYPES:
             raise AttributeError('Wrong type')
@@ -530,4 +1384,110 @@ class Search(object):
         else:
             return result
 
+    def _search_items(self, query, limit):
+        type, text = query
+        pages = self._get_pages(type, text)
+        return query, list(islice(
+            (obj for page in pages for obj in self._get(type, page)), limit,
+        ))
+
+    def search_many(self, queries, limit=1):
+        """Run queries concurrently in worker pool, pages of each query are
+        fetched only until limit of items is reached. Same queries are run
+        once and found objects are shared by identity caches.
+
+        Keyword Arguments:
+        queries -- iterable of (type, text)
+        limit -- max count of items of each query, all if None
+
+        Returns: iterator of ((type, text), list of objects) in order of
+        completion
+        """
+        queries = list(OrderedDict.fromkeys(queries))
+        for type, text in queries:
+            if type not in self.TYPES:
+                raise AttributeError('Wrong type')
+        return self.pool.imap_unordered(
+            self.bind(lambda query: self._search_items(query, limit)),
+            queries,
+        )
+
+
+class _NetworkOpener(object):
+    """Opener for response cache, its requests go through scheduler and
+    metrics of cursor"""
+
+    def __init__(self, search):
+        self.search = search
+
+    def open(self, request):
+        if isinstance(request, basestring):
+            return self.search._request(request)
+        return self.search._request(
+            request.get_full_url(), dict(request.header_items()),
+        )
+
+
+class SearchPool(object):
+    """Thread-safe pool of cursors, each with own opener and cookies"""
+
+    def __init__(self, size=4, factory=None, **kwargs):
+        """Create pool
+
+        Keyword Arguments:
+        size -- max count of cursors
+        factory -- callable creating cursor, for example logged in
+        **kwargs -- arguments of Search when factory is None
+        """
+        self.size = size
+        self._factory = factory or (lambda: Search(**kwargs))
+        self._idle = Queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Get idle cursor, blocks when all cursors are used"""
+        with self._lock:
+            if self._idle.empty() and self._created < self.size:
+                self._created += 1
+                return self._factory()
+        return self._idle.get()
+
+    def release(self, search):
+        self._idle.put(search)
+
+    def close(self):
+        """Close idle cursors, new ones are created when needed"""
+        while True:
+            try:
+                search = self._idle.get_nowait()
+            except Queue.Empty:
+                break
+            search.close()
+            with self._lock:
+                self._created -= 1
+
+    @contextmanager
+    def session(self):
+        """Acquire cursor and use it in current thread"""
+        search = self.acquire()
+        try:
+            with search:
+                yield search
+        finally:
+            self.release(search)
+
+    def map(self, function, items):
+        """Call function for each item in threads with own cursors"""
+        def call(item):
+            with self.session():
+                return function(item)
+        pool = ThreadPool(self.size)
+        try:
+            return pool.map(call, items)
+        finally:
+            pool.close()
+            pool.join()
+
+
 cursor = Search()
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Content-addressed disk cache of album covers"""
+
+from collections import OrderedDict
+from hashlib import md5, sha1
+import threading
+import os
+
+
+class CoverCache(object):
+    """Images are stored by sha1 of content, so same artwork of many
+    albums is stored once, urls refer to images. Least recently used
+    images are removed with their urls when size exceeds max_size, order
+    of use is kept in memory and loaded from mtimes on start."""
+
+    def __init__(self, directory, max_size=None):
+        """Create cache
+
+        Keyword Arguments:
+        directory -- directory of images and urls
+        max_size -- max bytes of images, unbounded if None
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = self.misses = self.deduplicated = self.evictions = 0
+        self._lock = threading.Lock()
+        for name in ('images', 'urls'):
+            if not os.path.isdir(os.path.join(directory, name)):
+                os.makedirs(os.path.join(directory, name))
+        self._load()
+
+    def _load(self):
+        """Read sizes and urls of images, least recently used first"""
+        images = []
+        for root, dirs, files in os.walk(
+            os.path.join(self.directory, 'images'),
+        ):
+            for name in files:
+                if '.' in name:
+                    continue  # not finished write
+                stat = os.stat(os.path.join(root, name))
+                images.append((stat.st_mtime, name, stat.st_size))
+        self._sizes = OrderedDict(
+            (digest, size) for mtime, digest, size in sorted(images)
+        )
+        self._urls = {}  # url file names by digest
+        urls_directory = os.path.join(self.directory, 'urls')
+        for name in os.listdir(urls_directory):
+            try:
+                with open(os.path.join(urls_directory, name)) as url_file:
+                    digest = url_file.read().split('\n', 1)[0]
+            except IOError:
+                continue
+            self._urls.setdefault(digest, set()).add(name)
+        self.size = sum(self._sizes.values())
+
+    def _image_path(self, digest):
+        return os.path.join(self.directory, 'images', digest[:2], digest)
+
+    def _url_path(self, url):
+        return os.path.join(self.directory, 'urls', md5(url).hexdigest())
+
+    def _used(self, digest):
+        """Move image to end of use order"""
+        self._sizes[digest] = self._sizes.pop(digest)
+
+    def _write(self, path, data):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        tmp_path = '%s.%d.%d' % (
+            path, os.getpid(), threading.current_thread().ident,
+        )
+        with open(tmp_path, 'wb') as cache_file:
+            cache_file.write(data)
+        os.rename(tmp_path, path)
+
+    def get(self, url):
+        """Get path of cached image of url or None"""
+        try:
+            with open(self._url_path(url)) as url_file:
+                digest, cached_url = url_file.read().split('\n', 1)
+            path = self._image_path(digest)
+            if cached_url != url:
+                raise IOError('Other url')
+            with self._lock:
+                if digest not in self._sizes:
+                    raise IOError('Evicted')
+                self._used(digest)
+            os.utime(path, None)  # order of use for next start
+        except (IOError, OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, url, data):
+        """Store image of url, returns its path"""
+        digest = sha1(data).hexdigest()
+        path = self._image_path(digest)
+        url_path = self._url_path(url)
+        with self._lock:
+            if digest in self._sizes:
+                self.deduplicated += 1
+                self._used(digest)
+                try:
+                    os.utime(path, None)
+                except OSError:  # removed by other process
+                    self._write(path, data)
+            else:
+                self._write(path, data)
+                self._sizes[digest] = len(data)
+                self.size += len(data)
+            self._write(url_path, '%s\n%s' % (digest, url))
+            self._urls.setdefault(digest, set()).add(
+                os.path.basename(url_path),
+            )
+            self._evict(digest)
+        return path
+
+    def _remove(self, digest):
+        self.size -= self._sizes.pop(digest)
+        try:
+            os.remove(self._image_path(digest))
+        except OSError:
+            pass
+        for name in self._urls.pop(digest, ()):
+            path = os.path.join(self.directory, 'urls', name)
+            try:
+                with open(path) as url_file:
+                    if url_file.read().split('\n', 1)[0] != digest:
+                        continue  # url refers to other image now
+                os.remove(path)
+            except (IOError, OSError):
+                pass
+
+    def _evict(self, keep):
+        """Remove least recently used images until size fits"""
+        if self.max_size is None:
+            return
+        while self.size > self.max_size and len(self._sizes) > 1:
+            digest = next(iter(self._sizes))
+            if digest == keep:
+                break
+            self._remove(digest)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for digest in list(self._sizes):
+                self._remove(digest)
+            self._urls = {}
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'deduplicated': self.deduplicated,
+            'evictions': self.evictions,
+            'size': self.size,
+            'images': len(self._sizes),
+        }
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Bulk tracks downloading"""
+
+from multiprocessing.pool import ThreadPool
+from urlparse import urlparse
+import threading
+import httplib
+import time
+import os
+from .transport import TokenBucket
+from .app import get_cursor
+
+
+class Downloader(object):
+    """Download many tracks in worker pool with bandwidth limits"""
+
+    def __init__(self, directory, workers=4, rate=None, host_rate=None,
+                 retries=3, segments=1, chunk_size=None, filename=None,
+                 on_progress=None, on_complete=None, on_error=None):
+        """Create downloader
+
+        Keyword Arguments:
+        directory -- directory for downloaded tracks
+        workers -- tracks downloaded simultaneously
+        rate -- max bytes per second for all downloads
+        host_rate -- max bytes per second for each host
+        retries -- retries of failed range of track, with backoff
+        segments -- ranges of single track downloaded in parallel
+        chunk_size -- size of read and written chunks
+        filename -- callable returning file name for track
+        on_progress -- callable receiving track and downloaded bytes
+        on_complete -- callable receiving track and path
+        on_error -- callable receiving track and exception
+        """
+        self.directory = directory
+        self.workers = workers
+        self.rate = TokenBucket(rate)
+        self.host_rate = host_rate
+        self.retries = retries
+        self.segments = segments
+        self.chunk_size = chunk_size
+        self.filename = filename or (lambda track: '%d.mp3' % track.id)
+        self.on_progress = on_progress
+        self.on_complete = on_complete
+        self.on_error = on_error
+        self.failed = []
+        self.skipped = []
+        self.downloaded_bytes = 0
+        self.started = None
+        self._host_rates = {}
+        self._lock = threading.Lock()
+
+    @property
+    def throughput(self):
+        """Bytes per second since download started"""
+        if not self.started:
+            return 0
+        return self.downloaded_bytes / max(time.time() - self.started, 1e-6)
+
+    def _get_host_rate(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_rates:
+                self._host_rates[host] = TokenBucket(self.host_rate)
+            return self._host_rates[host]
+
+    def _on_chunk(self, track, host_rate):
+        progress = [0]
+
+        def on_chunk(size):
+            self.rate.consume(size)
+            host_rate.consume(size)
+            progress[0] += size
+            with self._lock:
+                self.downloaded_bytes += size
+            if self.on_progress:
+                self.on_progress(track, progress[0])
+        return on_chunk
+
+    def _download(self, track):
+        path = os.path.join(self.directory, self.filename(track))
+        if os.path.exists(path):
+            self.skipped.append(track)
+            return path
+        try:
+            # url is resolved here too, so track without storage dir or
+            # with broken download info fails alone
+            track.download_to(
+                path, chunk_size=self.chunk_size, retries=self.retries,
+                segments=self.segments, on_chunk=self._on_chunk(
+                    track, self._get_host_rate(track.url),
+                ),
+            )
+        except (
+            IOError, httplib.HTTPException, AttributeError, ValueError,
+        ) as e:
+            self.failed.append(track)
+            if self.on_error:
+                self.on_error(track, e)
+            return None
+        if self.on_complete:
+            self.on_complete(track, path)
+        return path
+
+    def download(self, tracks):
+        """Download tracks, returns paths of downloaded and skipped"""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.started = self.started or time.time()
+        pool = ThreadPool(self.workers)
+        try:
+            return filter(None, pool.imap_unordered(
+                get_cursor().bind(self._download), tracks,
+            ))
+        finally:
+            pool.close()
+            pool.join()
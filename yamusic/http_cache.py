@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Cache of http responses with conditional revalidation"""
+
+from StringIO import StringIO
+from collections import OrderedDict
+from hashlib import md5
+import threading
+import mimetools
+import urllib2
+import urllib
+import base64
+import json
+import time
+import os
+import re
+from .app import IdentityCache
+
+_ENTRY_RE = re.compile(r'^[0-9a-f]{32}(\.\d+\.\d+)?$')
+
+
+class ResponseCache(object):
+    """Memory and disk cache in front of opener, responses are fresh
+    for ttl of first matched rule and revalidated with etag or
+    last-modified after it, urls without rule are not cached. Least
+    recently used files of disk tier are removed when it exceeds
+    disk_size"""
+    RULES = (
+        (r'//storage\.music\.yandex\.ru/download-info/', 10),
+        (r'//storage\.music\.yandex\.ru/get/', 3600),
+        (r'/fragment/search\?', 300),
+        (r'/fragment/(artist|album|track)/', 86400),
+    )
+
+    def __init__(self, directory=None, rules=None, memory_size=1000,
+                 disk_size=256 * 1024 * 1024):
+        """Create cache
+
+        Keyword Arguments:
+        directory -- directory for disk tier, memory only if None
+        rules -- sequence of (url regexp, ttl in seconds)
+        memory_size -- max responses count in memory tier
+        disk_size -- max bytes of disk tier, unbounded if None
+        """
+        self.directory = directory
+        self.rules = [
+            (re.compile(pattern), ttl)
+            for pattern, ttl in (self.RULES if rules is None else rules)
+        ]
+        self.memory = IdentityCache(max_size=memory_size)
+        self.disk_size = disk_size
+        self.hits = self.misses = self.revalidated = self.bypassed = 0
+        self.evictions = self.used_disk = 0
+        self.on_lookup = None
+        self._lock = threading.Lock()
+        self._files = OrderedDict()  # sizes of files in order of use
+        if directory:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._scan()
+
+    def _scan(self):
+        """Read sizes of own files, least recently used first"""
+        files = []
+        for name in os.listdir(self.directory):
+            if _ENTRY_RE.match(name) and '.' not in name:
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, name, stat.st_size))
+        self._files = OrderedDict(
+            (name, size) for mtime, name, size in sorted(files)
+        )
+        self.used_disk = sum(self._files.values())
+
+    def get_ttl(self, url):
+        for pattern, ttl in self.rules:
+            if pattern.search(url):
+                return ttl
+
+    def _path(self, url):
+        return os.path.join(self.directory, md5(url).hexdigest())
+
+    def _load(self, url):
+        entry = self.memory.get(url)
+        if entry is None and self.directory:
+            try:
+                with open(self._path(url)) as cache_file:
+                    entry = json.load(cache_file)
+            except (IOError, ValueError):
+                return None
+            if entry['url'] != url:
+                return None
+            name = os.path.basename(self._path(url))
+            with self._lock:
+                if name in self._files:
+                    self._files[name] = self._files.pop(name)
+            entry['body'] = base64.b64decode(entry['body'])
+            self.memory.set(url, entry)
+        return entry
+
+    def _save(self, entry):
+        self.memory.set(entry['url'], entry)
+        if self.directory:
+            path = self._path(entry['url'])
+            tmp_path = '%s.%d.%d' % (
+                path, os.getpid(), threading.current_thread().ident,
+            )
+            data = json.dumps(dict(
+                entry, body=base64.b64encode(entry['body']),
+            ))
+            with open(tmp_path, 'w') as cache_file:
+                cache_file.write(data)
+            os.rename(tmp_path, path)
+            name = os.path.basename(path)
+            with self._lock:
+                self.used_disk += len(data) - self._files.pop(name, 0)
+                self._files[name] = len(data)
+                self._evict(name)
+
+    def _evict(self, keep):
+        """Remove least recently used files until disk tier fits"""
+        if self.disk_size is None:
+            return
+        while self.used_disk > self.disk_size and len(self._files) > 1:
+            name = next(iter(self._files))
+            if name == keep:
+                break
+            self._remove(name)
+            self.evictions += 1
+
+    def _remove(self, name):
+        self.used_disk -= self._files.pop(name, 0)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+        if self.on_lookup is not None and name != 'bypassed':
+            self.on_lookup(name != 'misses')
+
+    def _response(self, entry):
+        response = urllib.addinfourl(
+            StringIO(entry['body']),
+            mimetools.Message(StringIO(entry['headers'])),
+            entry['url'],
+        )
+        response.code = response.status = entry['code']
+        response.msg = 'OK'
+        return response
+
+    def open(self, opener, url):
+        """Open url with opener or get it from cache"""
+        ttl = self.get_ttl(url)
+        if ttl is None:
+            self._count('bypassed')
+            return opener.open(url)
+        entry = self._load(url)
+        if entry and time.time() - entry['stored'] < ttl:
+            self._count('hits')
+            return self._response(entry)
+        request = urllib2.Request(url)
+        if entry and entry['etag']:
+            request.add_header('If-None-Match', entry['etag'])
+        if entry and entry['last_modified']:
+            request.add_header('If-Modified-Since', entry['last_modified'])
+        try:
+            response = opener.open(request)
+        except urllib2.HTTPError as e:
+            if e.code != 304 or not entry:
+                raise
+            e.close()
+            self._count('revalidated')
+            entry = dict(entry, stored=time.time())
+            self._save(entry)
+            return self._response(entry)
+        self._count('misses')
+        info = response.info()
+        entry = {
+            'url': url,
+            'body': response.read(),
+            'headers': str(info),
+            'code': response.getcode(),
+            'etag': info.getheader('ETag'),
+            'last_modified': info.getheader('Last-Modified'),
+            'stored': time.time(),
+        }
+        self._save(entry)
+        return self._response(entry)
+
+    def invalidate(self, url):
+        self.memory.invalidate(url)
+        if self.directory:
+            with self._lock:
+                self._remove(os.path.basename(self._path(url)))
+
+    def clear(self):
+        """Remove cached responses, other files of directory are kept"""
+        self.memory.clear()
+        if self.directory:
+            with self._lock:
+                for name in os.listdir(self.directory):
+                    if _ENTRY_RE.match(name):
+                        self._remove(name)
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidated': self.revalidated,
+            'bypassed': self.bypassed,
+            'evictions': self.evictions,
+            'disk': self.used_disk,
+            'memory': self.memory.stats,
+        }
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Local full-text index of cached artists, albums and tracks"""
+
+from bisect import bisect_left, insort
+import threading
+import re
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(*texts):
+    """Get lower case words of texts, cyrillic yo is same as ye"""
+    tokens = []
+    for text in texts:
+        if not text:
+            continue
+        if isinstance(text, str):
+            text = text.decode('utf-8', 'replace')
+        tokens += TOKEN_RE.findall(text.lower().replace(u'ё', u'е'))
+    return tokens
+
+
+class _Postings(object):
+    """Index of objects of one type"""
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.tokens = []  # sorted for prefix search
+        self.ids = {}  # token -> set of ids
+        self.documents = {}  # id -> tokens of object
+
+    def add(self, id, tokens):
+        old = self.documents.get(id, frozenset())
+        for token in old - tokens:
+            self.remove_token(id, token)
+        for token in tokens - old:
+            if token not in self.ids:
+                self.ids[token] = set()
+                insort(self.tokens, token)
+            self.ids[token].add(id)
+        self.documents[id] = tokens
+
+    def remove_token(self, id, token):
+        ids = self.ids[token]
+        ids.discard(id)
+        if not ids:
+            del self.ids[token]
+            del self.tokens[bisect_left(self.tokens, token)]
+
+    def remove(self, id):
+        for token in self.documents.pop(id, ()):
+            self.remove_token(id, token)
+
+    def prefixed(self, prefix):
+        """Iterate over sets of ids of tokens starting with prefix"""
+        index = bisect_left(self.tokens, prefix)
+        while index < len(self.tokens) and self.tokens[index].startswith(
+            prefix,
+        ):
+            yield self.ids[self.tokens[index]]
+            index += 1
+
+    def count(self, prefix, limit):
+        """Count ids of tokens starting with prefix, at most to limit"""
+        count = 0
+        for ids in self.prefixed(prefix):
+            count += len(ids)
+            if count >= limit:
+                break
+        return count
+
+    def search(self, tokens):
+        """Iterate over sorted ids of objects with tokens starting with each
+        of prefixes, only most selective prefix is looked up in postings"""
+        best, limit = None, None
+        for token in set(tokens):
+            count = self.count(token, limit or len(self.documents) + 1)
+            if limit is None or count < limit:
+                best, limit = token, count
+            if not limit:
+                return
+        ids = set()
+        for token_ids in self.prefixed(best):
+            ids |= token_ids
+        rest = [token for token in set(tokens) if token != best]
+        for id in sorted(ids):
+            if all(
+                any(word.startswith(token) for word in self.documents[id])
+                for token in rest
+            ):
+                yield id
+
+
+class LocalIndex(object):
+    """Inverted index filled by objects passing through identity caches,
+    objects evicted from caches are removed from index on search"""
+
+    def __init__(self):
+        self._types = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def add(self, obj):
+        """Index or reindex titles of object and its relations"""
+        tokens = frozenset(tokenize(*obj._terms()))
+        with self._lock:
+            if obj.TYPE not in self._types:
+                self._types[obj.TYPE] = _Postings(obj.__class__)
+            self._types[obj.TYPE].add(obj.cache()._key(obj.id), tokens)
+
+    def search(self, type, text, limit=None):
+        """Get cached objects having words starting with each word of text,
+        ordered by id
+
+        Keyword Arguments:
+        type -- Search.TYPE_TRACKS, TYPE_ALBUMS or TYPE_ARTISTS
+        text -- words or their beginnings
+        limit -- max count of objects, all if None
+
+        Returns: list
+        """
+        tokens = tokenize(text)
+        with self._lock:
+            postings = self._types.get(type)
+            ids = ()
+            if postings is not None and tokens:
+                ids = postings.search(tokens)
+            result = []
+            for id in ids:
+                obj = postings.cls.cache().peek(id)
+                if obj is None:
+                    postings.remove(id)
+                else:
+                    result.append(obj)
+                    if len(result) == limit:
+                        break
+            if result:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return result
+
+    def __len__(self):
+        with self._lock:
+            return sum(
+                len(postings.documents) for postings in self._types.values()
+            )
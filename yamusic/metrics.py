@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Metrics of requests, parsing and caches with hooks for export"""
+
+from contextlib import contextmanager
+from bisect import bisect_left
+import threading
+import pstats
+import cProfile
+import sys
+from .transport import RequestScheduler
+
+
+class Histogram(object):
+    """Counts of observed values in fixed buckets"""
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, buckets=None):
+        self.buckets = tuple(buckets or self.BUCKETS)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """Get cumulative counts by upper bound, last bound is inf"""
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(self.buckets + ('inf',), self.counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {'buckets': buckets, 'count': self.count, 'sum': self.sum}
+
+
+class Metrics(object):
+    """Collects latency and bytes of requests by url class, parse time
+    and cache lookups, passes every event to hooks"""
+
+    def __init__(self, buckets=None):
+        """Create metrics
+
+        Keyword Arguments:
+        buckets -- upper bounds of latency histograms in seconds
+        """
+        self.buckets = buckets
+        self.hooks = []
+        self.requests = {}
+        self.bytes = {}
+        self.errors = {}
+        self.parse_time = {}
+        self.caches = {}
+        self._classify = RequestScheduler().classify
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """Add callable receiving event name and dict of its data"""
+        self.hooks.append(hook)
+
+    def emit(self, event, **data):
+        for hook in self.hooks:
+            hook(event, data)
+
+    def _histogram(self, histograms, name):
+        if name not in histograms:
+            histograms[name] = Histogram(self.buckets)
+        return histograms[name]
+
+    def request(self, url, seconds, error=None):
+        """Record opened request"""
+        url_class = self._classify(url)
+        with self._lock:
+            self._histogram(self.requests, url_class).observe(seconds)
+            if error is not None:
+                self.errors[url_class] = self.errors.get(url_class, 0) + 1
+        self.emit(
+            'request', url=url, url_class=url_class, seconds=seconds,
+            error=error,
+        )
+
+    def response(self, url, size):
+        """Record size of read response body"""
+        url_class = self._classify(url)
+        with self._lock:
+            self.bytes[url_class] = self.bytes.get(url_class, 0) + size
+        self.emit('response', url=url, url_class=url_class, bytes=size)
+
+    def parse(self, name, seconds):
+        """Record wall time of parser call"""
+        with self._lock:
+            self._histogram(self.parse_time, name).observe(seconds)
+        self.emit('parse', name=name, seconds=seconds)
+
+    def cache_lookup(self, name, hit):
+        with self._lock:
+            counts = self.caches.setdefault(name, [0, 0])
+            counts[0 if hit else 1] += 1
+        self.emit('cache', name=name, hit=hit)
+
+    def watch(self, name, cache):
+        """Record lookups of IdentityCache or ResponseCache"""
+        cache.on_lookup = lambda hit: self.cache_lookup(name, hit)
+
+    def snapshot(self):
+        """Get all metrics as dict of plain values"""
+        with self._lock:
+            return {
+                'requests': dict(
+                    (name, histogram.snapshot())
+                    for name, histogram in self.requests.items()
+                ),
+                'bytes': dict(self.bytes),
+                'errors': dict(self.errors),
+                'parse': dict(
+                    (name, histogram.snapshot())
+                    for name, histogram in self.parse_time.items()
+                ),
+                'caches': dict(
+                    (name, {
+                        'hits': hits, 'misses': misses,
+                        'ratio': hits / float(hits + misses),
+                    })
+                    for name, (hits, misses) in self.caches.items()
+                ),
+            }
+
+
+@contextmanager
+def profile(path=None, sort='cumulative', limit=30, stream=None):
+    """Profile code in block with cProfile
+
+    Keyword Arguments:
+    path -- file for raw stats, printed to stream if None
+    sort -- sort key of printed stats
+    limit -- count of printed functions
+    stream -- stream for printed stats, stderr if None
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        else:
+            pstats.Stats(
+                profiler, stream=stream or sys.stderr,
+            ).sort_stats(sort).print_stats(limit)
@@ -0,0 +1,556 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Parsers of yandex music fragments to plain records"""
+
+from BeautifulSoup import BeautifulSoup
+from htmlentitydefs import name2codepoint
+from json.decoder import scanstring
+import multiprocessing
+import threading
+import string
+import json
+import re
+
+_JS_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (")
+        |(')
+        |([{}\[\]:,])
+        |(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+        |([A-Za-z_$][\w$]*)
+    )""", re.VERBOSE)
+_JS_SINGLE_QUOTED_RE = re.compile(r"((?:[^'\\]|\\.)*)'", re.DOTALL)
+_JS_SINGLE_QUOTED_ESCAPE_RE = re.compile(r'\\(.)|"', re.DOTALL)
+_JS_NAMES = {'true': True, 'false': False, 'null': None, 'undefined': None}
+_NOTHING = object()
+_SWAP_QUOTES = string.maketrans("'", '"')
+_SWAP_QUOTES_UNICODE = {ord("'"): u'"'}
+
+
+def fix_json_single_quotes(text):
+    def replace_quotes(match):
+        if match.group(1)[0] == "'":
+            return '"%s"'%(match.group(2).replace(r"\'","'").replace('"',r'\"'))
+        else:
+            return '"%s"'%(match.group(2))
+
+    return re.sub(r"""(["'])((?:\\?.)*?)\1""", replace_quotes, text);
+
+
+def _unescape_single_quoted(match):
+    if match.group(0) == '"':
+        return r'\"'
+    elif match.group(1) == "'":
+        return "'"
+    return match.group(0)
+
+
+def loads_js(text):
+    """Decode javascript object literal, tries C json decoder on text,
+    on text with swapped quotes and on text with escaped quotes, only
+    unquoted keys and trailing commas are left to tokenizer"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    if '\\\\' not in text and '\\"' not in text:
+        # escape quotes inside strings, so only delimiters are swapped
+        swapped = text.replace("\\'", '\\u0027').replace('"', '\\u0022')
+        if isinstance(swapped, unicode):
+            swapped = swapped.translate(_SWAP_QUOTES_UNICODE)
+        else:
+            swapped = swapped.translate(_SWAP_QUOTES)
+        try:
+            return json.loads(swapped)
+        except ValueError:
+            pass
+    else:
+        try:
+            return json.loads(fix_json_single_quotes(text))
+        except ValueError:
+            pass
+    return tokenize_js(text)
+
+
+def tokenize_js(text):
+    """Decode javascript object literal with single or double quoted
+    strings and unquoted keys in one pass"""
+    stack = []
+    container = None
+    key = _NOTHING
+    result = _NOTHING
+    pos = 0
+    while True:
+        match = _JS_TOKEN_RE.match(text, pos)
+        if not match:
+            if stack or result is _NOTHING or text[pos:].strip():
+                raise ValueError('Wrong js literal at %d' % pos)
+            return result
+        pos = match.end()
+        double_quote, single_quote, punct, number, name = match.groups()
+        opened = False
+        if double_quote:
+            value, pos = scanstring(text, pos)
+        elif single_quote:
+            quoted = _JS_SINGLE_QUOTED_RE.match(text, pos)
+            if not quoted:
+                raise ValueError('Unterminated string at %d' % pos)
+            value, _ = scanstring(_JS_SINGLE_QUOTED_ESCAPE_RE.sub(
+                _unescape_single_quoted, quoted.group(1),
+            ) + '"', 0)
+            pos = quoted.end()
+        elif punct:
+            if punct == '{':
+                value = {}
+                opened = True
+            elif punct == '[':
+                value = []
+                opened = True
+            elif punct in '}]':
+                if not stack:
+                    raise ValueError('Unexpected %s at %d' % (punct, pos))
+                container, key = stack.pop()
+                continue
+            else:
+                continue
+        elif number:
+            if number.isdigit() or number[1:].isdigit():
+                value = int(number)
+            else:
+                value = float(number)
+        elif type(container) is dict and key is _NOTHING:
+            key = name  # unquoted key
+            continue
+        elif name in _JS_NAMES:
+            value = _JS_NAMES[name]
+        else:
+            raise ValueError('Unexpected %s at %d' % (name, pos))
+        if container is None:
+            if result is not _NOTHING:
+                raise ValueError('Extra data at %d' % pos)
+            result = value
+        elif type(container) is dict:
+            if key is _NOTHING:
+                key = value
+                continue
+            container[key] = value
+            key = _NOTHING
+        else:
+            container.append(value)
+        if opened:
+            stack.append((container, key))
+            container = value
+            key = _NOTHING
+
+
+def remove_html(data):
+    p = re.compile(r'<.*?>')
+    try:
+        return p.sub('', data)
+    except TypeError:
+        return data
+
+
+def parse_onclick(onclick):
+    """Decode json or js literal from onclick handler"""
+    return loads_js(onclick[7:])  # skip return
+
+
+def parse_track(track):
+    """Get track record from decoded onclick"""
+    return {
+        'id': track['id'],
+        'title': track['title'],
+        'artist__id': track['artist_id'],
+        'artist__title': track['artist'],
+        'album__id': track['album_id'],
+        'album__title': track['album'],
+        'album__cover': track['cover'],
+        'storage_dir': track['storage_dir']
+    }
+
+
+def parse_album_track(track):
+    """Get track record from decoded onclick on album page"""
+    return {
+        'id': track['id'],
+        'title': track['title'],
+        'storage_dir': track['storage_dir'],
+        'duration': track['duration'],
+    }
+
+
+def get_pages_count(texts):
+    """Get pages count from pager texts, None if pager not found"""
+    try:
+        try:
+            return int(texts[-1])  # start form 1!
+        except UnicodeEncodeError:  # fix work with ... page
+            return int(texts[-2])  # start form 1!
+    except IndexError:
+        return None
+
+
+class SoupParser(object):
+    """Parser building BeautifulSoup tree"""
+
+    def _class_filter(self, cls_name):
+        """Create BeautifulSoup class filter"""
+        return {'class': re.compile(r'\b%s\b' % cls_name)}
+
+    def _title(self, soup):
+        return remove_html(
+            soup.find('h1', self._class_filter('b-title__title')).__unicode__()
+        )
+
+    def _tracks(self, soup):
+        for track in soup.findAll('div', self._class_filter('b-track')):
+            yield parse_track(parse_onclick(track['onclick']))
+
+    def _albums(self, soup):
+        for album in soup.findAll('div', self._class_filter('b-albums')):
+            cover_a = album.find('div', self._class_filter('b-albums__cover')).find('a')
+            artist_a = album.find('a',
+                self._class_filter('b-link_class_albums-title-link')
+            )
+            yield {
+                'id': cover_a['href'].split('/')[-1],
+                'title': remove_html(album.find('a',
+                    self._class_filter('b-link_class_albums-title-link')
+                ).__unicode__()),
+                'cover': cover_a.find('img')['src'],
+                'artist__id': artist_a['href'].split('/')[-1],
+                'artist__title': remove_html(artist_a.__unicode__()),
+            }
+
+    def _artists(self, soup):
+        for artist_group in soup.findAll(
+            'div', self._class_filter('b-artist-group')
+        ):
+            artist = artist_group.find('a')
+            yield {
+                'id': artist['href'].split('/')[-1],
+                'title': remove_html(artist.__unicode__()),
+            }
+
+    def search(self, type, data):
+        """Parse search page of type tracks, albums or artists"""
+        soup = BeautifulSoup(data)
+        pages_count = get_pages_count([
+            page.text for page in soup.findAll(
+                'a', self._class_filter('b-pager__page'),
+            )
+        ])
+        current_page = None
+        if pages_count is not None:
+            current_page = int(soup.find(
+                'b', self._class_filter('b-pager__current'),
+            ).text)  # start from 1!
+        return {
+            'pages_count': pages_count,
+            'current_page': current_page,
+            'items': list(getattr(self, '_' + type)(soup)),
+        }
+
+    def artist(self, data):
+        soup = BeautifulSoup(data)
+        albums = []
+        for album in soup.findAll(
+            'div', self._class_filter('b-album-control')
+        ):
+            try:
+                albums.append(parse_onclick(album['onclick']))
+            except ValueError:
+                pass
+        return {
+            'title': self._title(soup),
+            'albums': albums,
+        }
+
+    def album(self, data):
+        soup = BeautifulSoup(data)
+        artist_soup = soup.find(
+            'div', self._class_filter('b-title__artist')
+        ).find('a')
+        return {
+            'title': self._title(soup),
+            'artist': {
+                'id': artist_soup['href'].split('/')[-1],
+                'title': remove_html(artist_soup.__unicode__()),
+            },
+            'tracks': [
+                parse_album_track(parse_onclick(track['onclick']))
+                for track in soup.findAll(
+                    'div', self._class_filter('b-track'),
+                )
+            ],
+        }
+
+    def track(self, data):
+        soup = BeautifulSoup(data)
+        track = soup.find(
+            'div', self._class_filter('b-track b-track_type_track js-track'),
+        )
+        return parse_track(parse_onclick(track['onclick']))
+
+
+class _Tag(object):
+    """Start tag found by FastParser"""
+    ATTR_RE = re.compile(
+        r'''([\w:-]+)(?:\s*=\s*(?:'([^']*)'|"([^"]*)"|([^\s'">]+)))?''',
+    )
+    REF_RE = re.compile(r'&(?:#(\d+)|#[xX]([0-9a-fA-F]+)|(\w+));')
+
+    def __init__(self, name, attrs, start, end):
+        self.name = name
+        self._attrs = attrs
+        self.start = start
+        self.end = end
+
+    def _unescape(self, match):
+        number, hex_number, name = match.groups()
+        if number:
+            return unichr(int(number))
+        elif hex_number:
+            return unichr(int(hex_number, 16))
+        elif name in name2codepoint:
+            return unichr(name2codepoint[name])
+        return match.group(0)
+
+    def __getitem__(self, name):
+        for attr in self.ATTR_RE.finditer(self._attrs):
+            if attr.group(1).lower() == name:
+                value = next(
+                    (value for value in attr.groups()[1:] if value is not None),
+                    attr.group(1),
+                )
+                return self.REF_RE.sub(self._unescape, value)
+        raise KeyError(name)
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+
+class FastParser(object):
+    """Parser scanning fragment for known classes without building tree"""
+    TAG_RE = re.compile(r'<([a-zA-Z][\w:-]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>')
+
+    def __init__(self):
+        self._class_res = {}
+        self._close_res = {}
+
+    def _class_re(self, cls_name):
+        if cls_name not in self._class_res:
+            self._class_res[cls_name] = re.compile(r'\b%s\b' % cls_name)
+        return self._class_res[cls_name]
+
+    def _decode(self, data):
+        if isinstance(data, unicode):
+            return data
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            return data.decode('cp1251')
+
+    def _find_all(self, data, name, cls_name=None, start=0, end=None):
+        """Find start tags with name and class"""
+        class_re = cls_name and self._class_re(cls_name)
+        for match in self.TAG_RE.finditer(data, start, len(data) if end is None else end):
+            if match.group(1).lower() != name:
+                continue
+            tag = _Tag(name, match.group(2), match.start(), match.end())
+            if class_re and not class_re.search(tag.get('class', '')):
+                continue
+            yield tag
+
+    def _find(self, data, name, cls_name=None, start=0, end=None):
+        return next(self._find_all(data, name, cls_name, start, end), None)
+
+    def _inner(self, data, tag):
+        """Get inner html of not nested tag"""
+        if tag.name not in self._close_res:
+            self._close_res[tag.name] = re.compile(
+                r'</%s\s*>' % tag.name, re.IGNORECASE,
+            )
+        close = self._close_res[tag.name].search(data, tag.end)
+        return data[tag.end:close.start() if close else len(data)]
+
+    def _text(self, data, tag):
+        return remove_html(self._inner(data, tag))
+
+    def _title(self, data):
+        return self._text(data, self._find(data, 'h1', 'b-title__title'))
+
+    def _sections(self, data, name, cls_name):
+        """Iterate over tags with data until next tag of same kind"""
+        tags = list(self._find_all(data, name, cls_name))
+        for num, tag in enumerate(tags):
+            end = tags[num + 1].start if num + 1 < len(tags) else len(data)
+            yield tag, end
+
+    def _tracks(self, data):
+        for track in self._find_all(data, 'div', 'b-track'):
+            yield parse_track(parse_onclick(track['onclick']))
+
+    def _albums(self, data):
+        for album, end in self._sections(data, 'div', 'b-albums'):
+            cover = self._find(data, 'div', 'b-albums__cover', album.end, end)
+            cover_a = self._find(data, 'a', None, cover.end, end)
+            cover_img = self._find(data, 'img', None, cover_a.end, end)
+            artist_a = self._find(
+                data, 'a', 'b-link_class_albums-title-link', album.end, end,
+            )
+            yield {
+                'id': cover_a['href'].split('/')[-1],
+                'title': self._text(data, artist_a),
+                'cover': cover_img['src'],
+                'artist__id': artist_a['href'].split('/')[-1],
+                'artist__title': self._text(data, artist_a),
+            }
+
+    def _artists(self, data):
+        for artist_group, end in self._sections(data, 'div', 'b-artist-group'):
+            artist = self._find(data, 'a', None, artist_group.end, end)
+            yield {
+                'id': artist['href'].split('/')[-1],
+                'title': self._text(data, artist),
+            }
+
+    def search(self, type, data):
+        """Parse search page of type tracks, albums or artists"""
+        data = self._decode(data)
+        pages_count = get_pages_count([
+            self._text(data, page)
+            for page in self._find_all(data, 'a', 'b-pager__page')
+        ])
+        current_page = None
+        if pages_count is not None:
+            current_page = int(self._text(
+                data, self._find(data, 'b', 'b-pager__current'),
+            ))  # start from 1!
+        return {
+            'pages_count': pages_count,
+            'current_page': current_page,
+            'items': list(getattr(self, '_' + type)(data)),
+        }
+
+    def artist(self, data):
+        data = self._decode(data)
+        albums = []
+        for album in self._find_all(data, 'div', 'b-album-control'):
+            try:
+                albums.append(parse_onclick(album['onclick']))
+            except ValueError:
+                pass
+        return {
+            'title': self._title(data),
+            'albums': albums,
+        }
+
+    def album(self, data):
+        data = self._decode(data)
+        artist_div = self._find(data, 'div', 'b-title__artist')
+        artist_a = self._find(data, 'a', None, artist_div.end)
+        return {
+            'title': self._title(data),
+            'artist': {
+                'id': artist_a['href'].split('/')[-1],
+                'title': self._text(data, artist_a),
+            },
+            'tracks': [
+                parse_album_track(parse_onclick(track['onclick']))
+                for track in self._find_all(data, 'div', 'b-track')
+            ],
+        }
+
+    def track(self, data):
+        data = self._decode(data)
+        track = self._find(
+            data, 'div', 'b-track b-track_type_track js-track',
+        )
+        return parse_track(parse_onclick(track['onclick']))
+
+
+_worker_parser = None
+
+
+def _init_worker(parser):
+    global _worker_parser
+    _worker_parser = parser
+
+
+def _parse_in_worker(task):
+    method, args = task
+    return getattr(_worker_parser, method)(*args)
+
+
+class ProcessParser(object):
+    """Parser running other parser in pool of processes, which returns
+    plain records. Call blocks only calling thread, so fragments fetched
+    by worker threads of cursor are parsed on all cores."""
+
+    def __init__(self, parser=None, processes=None):
+        """Create parser, pool is started on first call
+
+        Keyword Arguments:
+        parser -- parser used in processes, FastParser if None
+        processes -- count of processes, count of cores if None
+        """
+        self.parser = parser or FastParser()
+        self.processes = processes
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(
+                    self.processes, _init_worker, (self.parser,),
+                )
+        return self._pool
+
+    def _parse(self, method, *args):
+        return self.pool.apply(_parse_in_worker, ((method, args),))
+
+    def search(self, type, data):
+        return self._parse('search', type, data)
+
+    def artist(self, data):
+        return self._parse('artist', data)
+
+    def album(self, data):
+        return self._parse('album', data)
+
+    def track(self, data):
+        return self._parse('track', data)
+
+    def map(self, method, fragments):
+        """Parse many fragments with method, like map('album', fragments)
+
+        Returns: list
+        """
+        return self.pool.map(_parse_in_worker, [
+            (method, (data,)) for data in fragments
+        ])
+
+    def close(self):
+        """Stop processes"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Incremental refresh of artists and albums with change detection"""
+
+from hashlib import md5
+import json
+from .app import Artist, Album, Track, get_cursor
+
+
+def _key(id):
+    try:
+        return int(id)
+    except (TypeError, ValueError):
+        return id
+
+
+def _album_state(title, tracks):
+    """Get fingerprint and tracks of album as (title, duration, storage_dir)
+    by track id"""
+    tracks = dict(
+        (_key(track['id']), (
+            track['title'], track.get('duration'), track['storage_dir'],
+        )) for track in tracks
+    )
+    return md5(json.dumps(
+        [title, sorted(tracks.items())], sort_keys=True,
+    )).hexdigest(), tracks
+
+
+class Changes(object):
+    """Albums and tracks added, removed and changed by refresh"""
+
+    def __init__(self):
+        self.albums = {'added': [], 'removed': [], 'changed': []}
+        self.tracks = {'added': [], 'removed': [], 'changed': []}
+        self.unchanged = []  # refreshed objects with same fragments
+
+    def _tracks(self, album, old, new):
+        objects = {}
+        if new:
+            objects = dict(
+                (_key(track.id), track) for track in album.get_tracks()
+            )
+        for id in new:
+            if id not in old:
+                self.tracks['added'].append(objects[id])
+            elif old[id] != new[id]:
+                self.tracks['changed'].append(objects[id])
+        self.tracks['removed'] += [
+            Track.get(id=id) for id in old if id not in new
+        ]
+
+    def __nonzero__(self):
+        return any(self.albums.values()) or any(self.tracks.values())
+
+    def __repr__(self):
+        return '<Changes: albums %s, tracks %s>' % tuple(
+            dict((name, len(items)) for name, items in changes.items())
+            for changes in (self.albums, self.tracks)
+        )
+
+
+class Refresher(object):
+    """Refreshes artists and albums, fragments with same fingerprint are
+    not parsed, changed ones are applied only to changed albums"""
+
+    def __init__(self, state=None):
+        """Create refresher
+
+        Keyword Arguments:
+        state -- dict-like storage of fingerprints between runs, for
+                 example shelve.open(path), in memory if None
+        """
+        self.state = {} if state is None else state
+
+    def _fetch(self, objects):
+        search = get_cursor()
+        return search.pool.map(
+            search.bind(lambda obj: search.fetch(obj._data_url())), objects,
+        )
+
+    def refresh(self, objects):
+        """Fetch fragments of artists and albums concurrently and apply
+        changed ones
+
+        Returns: Changes
+        """
+        objects = list(objects)
+        changes = Changes()
+        for obj, data in zip(objects, self._fetch(objects)):
+            key = 'page:%s:%s' % (obj.kind(), obj.id)
+            fingerprint = md5(data).hexdigest()
+            if self.state.get(key) == fingerprint and obj._loaded():
+                changes.unchanged.append(obj)
+                continue
+            record = obj._extract(data)
+            obj._save_record(record)
+            if isinstance(obj, Artist):
+                self._artist(obj, record, changes)
+            else:
+                self._album(obj, record, changes)
+            self.state[key] = fingerprint
+        return changes
+
+    def _album_diff(self, id, title, tracks):
+        """Get old and new tracks if album changed, update its state"""
+        key = 'album:%s' % _key(id)
+        fingerprint, new = _album_state(title, tracks)
+        old_fingerprint, old = self.state.get(key, (None, None))
+        self.state[key] = fingerprint, new
+        if fingerprint != old_fingerprint:
+            return old, new
+
+    def _album(self, album, record, changes):
+        diff = self._album_diff(album.id, record['title'], record['tracks'])
+        album._apply(record)
+        if diff is not None:
+            old, new = diff
+            changes.albums['changed' if old is not None else 'added'].append(
+                album,
+            )
+            changes._tracks(album, old or {}, new)
+
+    def _artist(self, artist, record, changes):
+        key = 'artist:%s' % _key(artist.id)
+        old_albums = self.state.get(key, [])
+        diffs = {}
+        for album_data in record['albums']:
+            diff = self._album_diff(
+                album_data['id'], album_data['title'],
+                album_data.get('tracks') or [],
+            )
+            if diff is not None:
+                diffs[_key(album_data['id'])] = diff
+        artist._apply(record, changed=diffs)
+        new_albums = [_key(album.id) for album in artist._albums]
+        self.state[key] = new_albums
+        for album in artist._albums:
+            if _key(album.id) in diffs:
+                old, new = diffs[_key(album.id)]
+                changes.albums[
+                    'changed' if _key(album.id) in old_albums else 'added'
+                ].append(album)
+                changes._tracks(album, old or {}, new)
+        for id in old_albums:
+            if id not in new_albums:
+                album = Album.get(id=id)
+                changes.albums['removed'].append(album)
+                changes._tracks(album, self.state.pop(
+                    'album:%s' % id, (None, {}),
+                )[1], {})
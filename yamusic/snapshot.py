@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Snapshots of identity caches for warm start
+
+File has header, sorted ids with offsets of marshalled records for
+artists and albums, sorted track ids with ids of their albums, and
+records. Artist record keeps ids of albums, album record keeps its tracks.
+"""
+
+from bisect import bisect_left
+import marshal
+import struct
+import mmap
+import os
+from .app import Search, TrackList
+
+MAGIC = 'YMSNAP1\n'
+HEADER = struct.Struct('<8s3Q')
+INT = struct.Struct('<q')
+TRACK_FIELDS = ('id', 'title', 'duration', 'storage_dir')
+
+
+class _Column(object):
+    """Int64 values in buffer, read without copying"""
+
+    def __init__(self, buffer, offset, count):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return INT.unpack_from(self._buffer, self._offset + index * 8)[0]
+
+
+def _key(id):
+    try:
+        return int(id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _album_tracks(album):
+    tracks = album._tracks
+    if isinstance(tracks, TrackList):
+        return [
+            (id, title, None if duration == -1 else duration, storage_dir)
+            for id, title, duration, storage_dir in zip(
+                tracks.ids, tracks.titles, tracks.durations,
+                tracks.storage_dirs,
+            )
+        ]
+    return [
+        (track.id, track.title, track.duration, track.storage_dir)
+        for track in tracks
+    ]
+
+
+def _pack(values):
+    return struct.pack('<%dq' % len(values), *values)
+
+
+def dump(path):
+    """Save loaded artists and albums with tracks from identity caches
+
+    Returns: dict with counts of saved items by kind
+    """
+    albums = {}
+    for obj in Search.ALBUMS_CACHE.values() + [
+        track.album for track in Search.TRACKS_CACHE.values()
+        if hasattr(track, 'album')
+    ] + [
+        album for artist in Search.ARTISTS_CACHE.values()
+        if artist._loaded() for album in artist._albums
+    ]:
+        if obj._loaded() and hasattr(obj, 'artist') and (
+            _key(obj.id) is not None
+        ):
+            albums[_key(obj.id)] = obj
+    artists = dict(
+        (_key(artist.id), artist)
+        for artist in Search.ARTISTS_CACHE.values()
+        if artist._loaded() and _key(artist.id) is not None
+    )
+    tracks = {}
+    album_records = []
+    for id, album in sorted(albums.items()):
+        album_tracks = _album_tracks(album)
+        for track in album_tracks:
+            tracks[track[0]] = id
+        album_records.append(marshal.dumps((
+            album.title, album.cover, album.artist.id, album.artist.title,
+            album_tracks,
+        )))
+    artist_records = [
+        marshal.dumps((artist.title, [
+            _key(album.id) for album in artist._albums
+            if _key(album.id) in albums
+        ])) for id, artist in sorted(artists.items())
+    ]
+    track_ids = sorted(tracks)
+    position = HEADER.size + 8 * (
+        2 * len(artists) + 2 * len(albums) + 2 * len(tracks) + 2
+    )
+    offsets = []
+    for records in (artist_records, album_records):
+        offsets.append([position])
+        for record in records:
+            position += len(record)
+            offsets[-1].append(position)
+    with open(path + '.tmp', 'wb') as output:
+        output.write(HEADER.pack(
+            MAGIC, len(artists), len(albums), len(tracks),
+        ))
+        output.write(_pack(sorted(artists)))
+        output.write(_pack(offsets[0]))
+        output.write(_pack(sorted(albums)))
+        output.write(_pack(offsets[1]))
+        output.write(_pack(track_ids))
+        output.write(_pack([tracks[id] for id in track_ids]))
+        for record in artist_records + album_records:
+            output.write(record)
+    os.rename(path + '.tmp', path)
+    return {
+        'artist': len(artists), 'album': len(albums), 'track': len(tracks),
+    }
+
+
+class Snapshot(object):
+    """Read-only records from snapshot, can be used as Search.STORAGE.
+    Records are decoded when loaded, so objects are created only for
+    used artists, albums and tracks"""
+
+    def __init__(self, path, use_mmap=True, storage=None):
+        """Open snapshot
+
+        Keyword Arguments:
+        path -- snapshot file
+        use_mmap -- map file to memory instead of reading it
+        storage -- storage for new records, it is checked first
+        """
+        self.path = path
+        self.storage = storage
+        self._invalidated = set()
+        self._cleared = False
+        with open(path, 'rb') as snapshot_file:
+            if use_mmap:
+                self._buffer = mmap.mmap(
+                    snapshot_file.fileno(), 0, access=mmap.ACCESS_READ,
+                )
+            else:
+                self._buffer = snapshot_file.read()
+        magic, artists, albums, tracks = HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            raise ValueError('Not a snapshot: %s' % path)
+        self.counts = {'artist': artists, 'album': albums, 'track': tracks}
+        offset = HEADER.size
+        columns = []
+        for count, size in (
+            (artists, artists + 1), (albums, albums + 1), (tracks, tracks),
+        ):
+            columns.append((
+                _Column(self._buffer, offset, count),
+                _Column(self._buffer, offset + count * 8, size),
+            ))
+            offset += (count + size) * 8
+        self._artists, self._albums, self._tracks = columns
+
+    def _find(self, ids, id):
+        index = bisect_left(ids, id)
+        if index < len(ids) and ids[index] == id:
+            return index
+
+    def _record(self, columns, id):
+        ids, offsets = columns
+        index = self._find(ids, id)
+        if index is not None:
+            return marshal.loads(
+                self._buffer[offsets[index]:offsets[index + 1]],
+            )
+
+    def _load_album(self, id):
+        album = self._record(self._albums, id)
+        if album is not None:
+            title, cover, artist_id, artist_title, tracks = album
+            return {
+                'title': title,
+                'cover': cover,
+                'artist': {'id': artist_id, 'title': artist_title},
+                'tracks': [dict(zip(TRACK_FIELDS, track)) for track in tracks],
+            }
+
+    def _load_artist(self, id):
+        artist = self._record(self._artists, id)
+        if artist is not None:
+            title, album_ids = artist
+            albums = []
+            for album_id in album_ids:
+                album = self._load_album(album_id)
+                albums.append({
+                    'id': album_id,
+                    'title': album['title'],
+                    'cover': album['cover'],
+                    'tracks': album['tracks'],
+                })
+            return {'title': title, 'albums': albums}
+
+    def _load_track(self, id):
+        ids, album_ids = self._tracks
+        index = self._find(ids, id)
+        if index is None:
+            return None
+        album_id = album_ids[index]
+        album = self._load_album(album_id)
+        for track in album['tracks']:
+            if track['id'] == id:
+                return {
+                    'id': id,
+                    'title': track['title'],
+                    'artist__id': album['artist']['id'],
+                    'artist__title': album['artist']['title'],
+                    'album__id': album_id,
+                    'album__title': album['title'],
+                    'album__cover': album['cover'],
+                    'storage_dir': track['storage_dir'],
+                }
+
+    def load(self, kind, id):
+        """Get record or None if not found or invalidated"""
+        if self.storage is not None:
+            record = self.storage.load(kind, id)
+            if record is not None:
+                return record
+        id = _key(id)
+        if self._cleared or id is None or (kind, id) in self._invalidated:
+            return None
+        loader = getattr(self, '_load_' + kind, None)
+        if loader is not None:
+            return loader(id)
+
+    def save(self, kind, id, record):
+        if self.storage is not None:
+            self.storage.save(kind, id, record)
+
+    def invalidate(self, kind, id):
+        self._invalidated.add((kind, _key(id)))
+        if self.storage is not None:
+            self.storage.invalidate(kind, id)
+
+    def clear(self):
+        self._cleared = True
+        if self.storage is not None:
+            self.storage.clear()
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+
+def load(path, use_mmap=True):
+    """Use snapshot as storage of cursors, current storage is kept
+    for new records
+
+    Returns: Snapshot
+    """
+    Search.STORAGE = Snapshot(path, use_mmap, Search.STORAGE)
+    return Search.STORAGE
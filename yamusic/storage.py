@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Persistent storage of parsed artists, albums and tracks"""
+
+import threading
+import sqlite3
+import json
+import time
+import os
+
+
+class SQLiteStorage(object):
+    """Parsed records in sqlite database, can be shared between
+    threads and processes"""
+
+    def __init__(self, path, max_age=None, timeout=30):
+        """Create storage
+
+        Keyword Arguments:
+        path -- database file
+        max_age -- seconds before record is stale, can be dict
+                   with max age for each kind, never stale if None
+        timeout -- seconds to wait for locked database
+        """
+        self.path = path
+        self.max_age = max_age
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        """Connection for current thread and process"""
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS records ('
+                    'kind TEXT, id TEXT, data TEXT, updated REAL, '
+                    'PRIMARY KEY (kind, id))'
+                )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def _key(self, id):
+        try:
+            return str(int(id))
+        except (TypeError, ValueError):
+            return unicode(id)
+
+    def _get_max_age(self, kind):
+        if isinstance(self.max_age, dict):
+            return self.max_age.get(kind)
+        return self.max_age
+
+    def load(self, kind, id):
+        """Get record or None if not found or stale"""
+        row = self.connection.execute(
+            'SELECT data, updated FROM records WHERE kind = ? AND id = ?',
+            (kind, self._key(id)),
+        ).fetchone()
+        if row is None:
+            return None
+        data, updated = row
+        max_age = self._get_max_age(kind)
+        if max_age is not None and time.time() - updated > max_age:
+            return None
+        return json.loads(data)
+
+    def save(self, kind, id, record):
+        with self.connection as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)',
+                (kind, self._key(id), json.dumps(record), time.time()),
+            )
+
+    def invalidate(self, kind, id):
+        with self.connection as connection:
+            connection.execute(
+                'DELETE FROM records WHERE kind = ? AND id = ?',
+                (kind, self._key(id)),
+            )
+
+    def clear(self):
+        with self.connection as connection:
+            connection.execute('DELETE FROM records')
@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Keep-alive and compression handlers for urllib2"""
+
+from StringIO import StringIO
+from urlparse import urlparse
+import threading
+import urllib2
+import random
+import sys
+import time
+import urllib
+import httplib
+import socket
+import zlib
+import re
+
+
+class TokenBucket(object):
+    """Rate limit, consumers sleep while bucket is in debt"""
+
+    def __init__(self, rate, burst=None):
+        """Create bucket
+
+        Keyword Arguments:
+        rate -- tokens per second, unlimited if None
+        burst -- max tokens collected while idle, equals rate if None
+        """
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """Take tokens, returns seconds to wait before using them"""
+        if not self.rate:
+            return 0
+        with self._lock:
+            now = time.time()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate,
+            ) - amount
+            self._updated = now
+            return max(-self._tokens / float(self.rate), 0)
+
+    def consume(self, amount=1):
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AdaptiveBucket(TokenBucket):
+    """Token bucket halving rate on throttling and restoring it
+    gradually after successful requests"""
+
+    def __init__(self, rate, burst=None):
+        super(AdaptiveBucket, self).__init__(rate, burst)
+        self.max_rate = rate
+
+    def slow_down(self):
+        if self.rate:
+            with self._lock:
+                self.rate = max(self.max_rate / 32.0, self.rate / 2.0)
+
+    def speed_up(self):
+        if self.rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 8.0)
+
+
+class RequestScheduler(object):
+    """Rate limits per host and url class, slowed down on throttling,
+    with retries of failed requests after jittered exponential backoff"""
+    CLASSES = (
+        ('search', r'/fragment/search\?'),
+        ('fragment', r'/fragment/'),
+        ('storage', r'//storage\.'),
+    )
+    LIMITS = {
+        'search': {'rate': 5, 'retries': 5},
+        'fragment': {'rate': 10, 'retries': 5},
+        'storage': {'rate': 20, 'retries': 3},
+        'default': {'rate': None, 'retries': 3},
+    }
+    RETRY_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, limits=None, backoff=0.5, max_backoff=60):
+        """Create scheduler
+
+        Keyword Arguments:
+        limits -- dict of url class to dict with rate (requests per second
+                  to each host), burst and retries, updates LIMITS
+        backoff -- delay before first retry, doubled after each failure
+        max_backoff -- max delay before retry
+        """
+        self.limits = dict(
+            (name, dict(limit)) for name, limit in self.LIMITS.items()
+        )
+        for name, limit in (limits or {}).items():
+            self.limits.setdefault(name, {}).update(limit)
+        self.classes = [
+            (name, re.compile(pattern)) for name, pattern in self.CLASSES
+        ]
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retried = self.throttled = 0
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        return {'retried': self.retried, 'throttled': self.throttled}
+
+    def classify(self, url):
+        for name, pattern in self.classes:
+            if pattern.search(url):
+                return name
+        return 'default'
+
+    def bucket(self, url):
+        """Get rate limit of url host and class"""
+        name = self.classify(url)
+        key = (urlparse(url).netloc, name)
+        with self._lock:
+            if key not in self._buckets:
+                limit = self.limits.get(name, {})
+                self._buckets[key] = AdaptiveBucket(
+                    limit.get('rate'), limit.get('burst'),
+                )
+            return self._buckets[key]
+
+    def wait(self, url):
+        """Get seconds to wait before request"""
+        return self.bucket(url).reserve()
+
+    def succeeded(self, url):
+        self.bucket(url).speed_up()
+
+    def failed(self, url, failures, error, network=False):
+        """Get seconds to wait before retry, reraises error when it can't
+        be retried, must be called in except block, network errors are
+        errors without response like timeouts"""
+        exc_info = sys.exc_info()
+        if hasattr(error, 'close'):
+            error.close()  # release connection of error response
+        code = None if network else getattr(error, 'code', None)
+        if code is not None and code not in self.RETRY_CODES:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        if code is not None:
+            self.bucket(url).slow_down()
+            with self._lock:
+                self.throttled += 1
+        retries = self.limits.get(self.classify(url), {}).get('retries', 0)
+        if failures > retries:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        with self._lock:
+            self.retried += 1
+        delay = min(
+            self.backoff * 2 ** (failures - 1), self.max_backoff,
+        ) * random.uniform(0.5, 1.5)
+        headers = getattr(error, 'hdrs', None) or getattr(
+            getattr(error, 'response', None), 'headers', None,
+        )
+        retry_after = headers and headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(int(retry_after), self.max_backoff))
+        return delay
+
+    def call(self, url, function, *args):
+        """Call function requesting url with rate limit and retries"""
+        failures = 0
+        while True:
+            time.sleep(self.wait(url))
+            try:
+                result = function(*args)
+            except (IOError, httplib.HTTPException) as e:
+                failures += 1
+                time.sleep(self.failed(url, failures, e))
+            else:
+                self.succeeded(url)
+                return result
+
+
+class _Flight(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.event.wait()
+        if self.error:
+            raise self.error[0], self.error[1], self.error[2]
+        return self.result
+
+
+class SingleFlight(object):
+    """Run only one call for concurrent callers with the same key,
+    others wait for it and share result"""
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        return {'calls': self.calls, 'coalesced': self.coalesced}
+
+    def do(self, key, function, *args):
+        """Call function in current thread or wait for running call"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if leader:
+            try:
+                flight.result = function(*args)
+            except BaseException:
+                flight.error = sys.exc_info()
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.event.set()
+        return flight.wait()
+
+    def do_async(self, key, function, *args):
+        """Share future returned by function among concurrent callers"""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            self.calls += 1
+        future = function(*args)
+        if not future.done():
+            with self._lock:
+                self._futures[key] = future
+            future.add_done_callback(lambda _: self._forget(key, future))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+
+class ConnectionPool(object):
+    """Idle keep-alive connections with limit of connections per host"""
+    CONNECTIONS = {
+        'http': httplib.HTTPConnection,
+        'https': httplib.HTTPSConnection,
+    }
+
+    def __init__(self, max_per_host=4, timeout=None, acquire_timeout=60):
+        """Create pool
+
+        Keyword Arguments:
+        max_per_host -- max simultaneously used connections to host
+        timeout -- socket timeout in seconds
+        acquire_timeout -- seconds to wait for free connection to host
+        """
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self._idle = {}
+        self._used = {}
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def acquire(self, scheme, host):
+        """Get idle or new connection, blocks when host limit reached
+
+        Raises: urllib2.URLError if no connection released in
+        acquire_timeout
+        """
+        key = scheme, host
+        deadline = time.time() + self.acquire_timeout
+        with self._lock:
+            while self._used.get(key, 0) >= self.max_per_host:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise urllib2.URLError(
+                        'no free connection to %s' % host,
+                    )
+                self._released.wait(remaining)
+            self._used[key] = self._used.get(key, 0) + 1
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        if self.timeout is None:
+            return self.CONNECTIONS[scheme](host)
+        return self.CONNECTIONS[scheme](host, timeout=self.timeout)
+
+    def release(self, scheme, host, connection, reuse=True):
+        if not reuse:
+            connection.close()
+        with self._lock:
+            if reuse:
+                self._idle.setdefault((scheme, host), []).append(connection)
+            self._used[scheme, host] -= 1
+            self._released.notify()
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+class _PooledSocket(object):
+    """Socket-like wrapper returning connection to pool after response
+    was read or closed"""
+
+    def __init__(self, response, release):
+        self._response = response
+        self._release = release
+
+    def recv(self, size):
+        data = self._response.read(size)
+        if self._response.isclosed():
+            self.close()
+        return data
+
+    def close(self):
+        if self._release:
+            release, self._release = self._release, None
+            reuse = self._response.isclosed() and not self._response.will_close
+            self._response.close()
+            release(reuse)
+
+
+class KeepAliveHandler(urllib2.HTTPHandler, urllib2.HTTPSHandler):
+    """Handler reusing connections from pool"""
+
+    def __init__(self, pool=None):
+        urllib2.HTTPHandler.__init__(self)
+        self.pool = pool or ConnectionPool()
+
+    def http_open(self, req):
+        return self._open(req, 'http')
+
+    def https_open(self, req):
+        return self._open(req, 'https')
+
+    def _request(self, connection, req):
+        headers = dict(req.unredirected_hdrs)
+        headers.update(req.headers)
+        headers = dict(
+            (name.title(), value) for name, value in headers.items()
+        )
+        headers['Connection'] = 'keep-alive'
+        connection.request(
+            req.get_method(), req.get_selector(), req.data, headers,
+        )
+        return connection.getresponse()
+
+    def _open(self, req, scheme):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+        while True:
+            connection = self.pool.acquire(scheme, host)
+            reused = connection.sock is not None
+            try:
+                response = self._request(connection, req)
+                break
+            except (socket.error, httplib.HTTPException) as e:
+                self.pool.release(scheme, host, connection, reuse=False)
+                if not reused:
+                    raise urllib2.URLError(e)
+                # server closed idle connection, retry with new one
+        if response.status >= 400:
+            # error response can be kept in HTTPError, so its body is read
+            # and connection is released before it is raised
+            try:
+                fp = StringIO(response.read())
+            except (socket.error, httplib.HTTPException) as e:
+                self.pool.release(scheme, host, connection, reuse=False)
+                raise urllib2.URLError(e)
+            self.pool.release(
+                scheme, host, connection, reuse=not response.will_close,
+            )
+        else:
+            if response.length == 0:
+                response.read()  # release connection of bodiless response
+
+            def release(reuse):
+                self.pool.release(scheme, host, connection, reuse)
+
+            fp = socket._fileobject(
+                _PooledSocket(response, release), close=True,
+            )
+        result = urllib.addinfourl(fp, response.msg, req.get_full_url())
+        result.code = response.status
+        result.msg = response.reason
+        return result
+
+
+class GzipProcessor(urllib2.BaseHandler):
+    """Ask for compressed responses and decode them, byte ranges are
+    asked without compression"""
+    handler_order = 600
+
+    def http_request(self, req):
+        if not req.has_header('Accept-encoding'):
+            req.add_unredirected_header(
+                'Accept-Encoding',
+                'identity' if req.has_header('Range') else 'gzip, deflate',
+            )
+        return req
+
+    def http_response(self, req, response):
+        info = response.info()
+        encoding = info.getheader('Content-Encoding', '').strip().lower()
+        if encoding not in ('gzip', 'deflate'):
+            return response
+        data = response.read()
+        response.close()
+        if encoding == 'gzip':
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        else:
+            try:
+                data = zlib.decompress(data)
+            except zlib.error:
+                data = zlib.decompress(data, -zlib.MAX_WBITS)
+        del info['Content-Encoding']
+        del info['Content-Length']
+        result = urllib.addinfourl(StringIO(data), info, response.geturl())
+        result.code = response.code
+        result.msg = response.msg
+        return result
+
+    https_request = http_request
+    https_response = http_response